@@ -8,6 +8,12 @@ __maintainer__ = "Andressa Oliveira <soliveira.andressa@gmail.com>"
 __copyright__ = "2025, Andressa Oliveira"
 __license__ = "MIT"
 
-from app.gui.app import WBSApp
+__all__ = ['WBSApp', '__version__']
 
-__all__ = ['WBSApp', '__version__']
\ No newline at end of file
+
+def __getattr__(name):
+    # Lazy so that headless entry points (app.cli) never import tkinter.
+    if name == "WBSApp":
+        from app.gui.app import WBSApp
+        return WBSApp
+    raise AttributeError(f"module 'app' has no attribute {name!r}")
\ No newline at end of file
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+WBS Filling From IFC - buildingSMART Portugal
+Entry point em linha de comandos (sem interface gráfica)
+
+    python -m app.cli extract --wbs WBS.xlsx --map mapeamento.json --ifc modelo.ifc --out pasta
+    python -m app.cli diff --map mapeamento.json --old rev1.ifc --new rev2.ifc --out pasta
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+from app.gui.wbs_helpers import read_wbs_excel, unpack_core_columns
+from app.core.model_cache import ModelIndexCache, ResultCache
+from app.core.run_stats import RunStats
+from app.core.structural_engine import IFCInvestigator, load_and_migrate_rules
+from app.core.report_pipeline import (
+    generate_report, export_elements_csv, export_elements_parquet,
+)
+from app.core.revision_diff import generate_diff
+
+
+def _log(msg: str):
+    print(msg, flush=True)
+
+
+def load_rules_file(path) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    rules = load_and_migrate_rules(data)
+    if not rules:
+        raise RuntimeError("Mapeamento: estrutura inválida ou vazia.")
+    return rules
+
+
+def run_extract(args) -> int:
+    for label, path in (("WBS", args.wbs), ("Mapeamento", args.map), ("IFC", args.ifc)):
+        if not Path(path).is_file():
+            raise RuntimeError(f"{label}: ficheiro não encontrado ({path}).")
+
+    rules = load_rules_file(args.map)
+    _log(f"Mapeamento: {len(rules)} código(s) WBS")
+
+    _log(f"Carregando WBS: {Path(args.wbs).name}")
+    df_raw, cols = read_wbs_excel(args.wbs)
+    if not all(unpack_core_columns(cols)):
+        raise RuntimeError("Não foi possível detectar as colunas WBS/Descrição/Nível.")
+
+    stats = RunStats()
+    _log(f"Carregando IFC: {Path(args.ifc).name}")
+    inv = IFCInvestigator(index_cache=None if args.no_cache else ModelIndexCache())
+    with stats.span("ifc_open"):
+        inv.open_ifc(args.ifc, indexed=True)
+    if inv.index_from_cache:
+        _log("Índice do modelo lido da cache")
+
+    result = generate_report(inv, rules, df_raw, cols, args.ifc, args.out, log=_log,
+                             workers=args.workers,
+                             result_cache=None if args.no_cache else ResultCache(),
+                             stats=stats)
+
+    if not args.no_csv:
+        csv_path = export_elements_csv(
+            result["csv_cache"], result["code_extensions"], args.out, Path(args.ifc).stem,
+        )
+        _log(f"✓ {csv_path.name} exportado")
+
+    if args.parquet:
+        pq_path = export_elements_parquet(
+            result["csv_cache"], result["code_extensions"], args.out, Path(args.ifc).stem,
+        )
+        _log(f"✓ {pq_path.name} exportado")
+
+    return 0
+
+
+def run_diff(args) -> int:
+    for label, path in (("Mapeamento", args.map), ("IFC anterior", args.old), ("IFC novo", args.new)):
+        if not Path(path).is_file():
+            raise RuntimeError(f"{label}: ficheiro não encontrado ({path}).")
+
+    rules = load_rules_file(args.map)
+    _log(f"Mapeamento: {len(rules)} código(s) WBS")
+
+    generate_diff(
+        rules, args.old, args.new, args.out, log=_log, workers=args.workers,
+        index_cache=None if args.no_cache else ModelIndexCache(),
+        result_cache=None if args.no_cache else ResultCache(),
+    )
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m app.cli",
+        description="Extração de quantidades IFC → WBS sem interface gráfica.",
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_extract = sub.add_parser(
+        "extract",
+        help="Gerar MapaQuantidadesTrabalhos, ElementosVerificados e ElementosQuantificados.",
+    )
+    p_extract.add_argument("--wbs", required=True, help="WBS com descrições (Excel)")
+    p_extract.add_argument("--map", required=True, help="Mapeamento (JSON)")
+    p_extract.add_argument("--ifc", required=True, help="Modelo IFC")
+    p_extract.add_argument("--out", required=True, help="Pasta de saída")
+    p_extract.add_argument("--no-csv", action="store_true",
+                           help="Não exportar o CSV ElementosQuantificados")
+    p_extract.add_argument("--parquet", action="store_true",
+                           help="Exportar também ElementosQuantificados em Parquet (requer pyarrow)")
+    p_extract.add_argument("--workers", type=int, default=1,
+                           help="Processos paralelos para avaliar as regras (por defeito 1;"
+                                " cada processo volta a abrir o IFC)")
+    p_extract.add_argument("--no-cache", action="store_true",
+                           help="Não usar a cache em disco do índice do modelo nem dos resultados")
+    p_extract.set_defaults(func=run_extract)
+
+    p_diff = sub.add_parser(
+        "diff",
+        help="Comparar duas revisões IFC com o mesmo mapeamento (diferenças por código WBS).",
+    )
+    p_diff.add_argument("--map", required=True, help="Mapeamento (JSON)")
+    p_diff.add_argument("--old", required=True, help="Modelo IFC da revisão anterior")
+    p_diff.add_argument("--new", required=True, help="Modelo IFC da revisão nova")
+    p_diff.add_argument("--out", required=True, help="Pasta de saída")
+    p_diff.add_argument("--workers", type=int, default=1,
+                        help="Processos paralelos para avaliar as regras (por defeito 1;"
+                             " cada processo volta a abrir o IFC)")
+    p_diff.add_argument("--no-cache", action="store_true",
+                        help="Não usar a cache em disco do índice do modelo nem dos resultados")
+    p_diff.set_defaults(func=run_diff)
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    try:
+        return args.func(args)
+    except KeyboardInterrupt:
+        print("\nInterrompido pelo utilizador")
+        return 130
+    except Exception as e:
+        print(f"\nERRO: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,69 @@
+import csv
+import os
+import tempfile
+import weakref
+
+SPOOL_FIELDS = [
+    "code", "group_value",
+    "ifc_class", "predefined", "objecttype",
+    "material", "guid", "buildingstorey", "classification_code",
+    "value", "qty_type",
+]
+
+
+def _unlink(path):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+class DetailSpool:
+
+    def __init__(self, directory=None):
+        fd, self.path = tempfile.mkstemp(prefix="wbs_detalhes_", suffix=".csv", dir=directory)
+        self._fh = os.fdopen(fd, "w", newline="", encoding="utf-8")
+        self._writer = csv.writer(self._fh)
+        self._writer.writerow(SPOOL_FIELDS)
+        self._finalizer = weakref.finalize(self, _unlink, self.path)
+        self.count = 0
+
+    def write(self, code: str, records, qty_type: str):
+        for rec in records:
+            self._writer.writerow([
+                code,
+                rec.get("group_value") or "",
+                rec.get("ifc_class", "n/a"),
+                rec.get("predefined", "n/a"),
+                rec.get("objecttype", "n/a"),
+                rec.get("material", "n/a"),
+                rec.get("guid", "n/a"),
+                rec.get("buildingstorey", "n/a"),
+                rec.get("classification_code", "n/a"),
+                rec.get("value"),
+                qty_type,
+            ])
+            self.count += 1
+
+    def close(self):
+        if not self._fh.closed:
+            self._fh.close()
+
+    def iter_codes(self):
+        self.close()
+        code, block = None, []
+        with open(self.path, newline="", encoding="utf-8") as f:
+            reader = csv.reader(f)
+            fields = next(reader)
+            for values in reader:
+                if values[0] != code and block:
+                    yield code, block
+                    block = []
+                code = values[0]
+                block.append(dict(zip(fields, values)))
+        if block:
+            yield code, block
+
+    def discard(self):
+        self.close()
+        self._finalizer()
@@ -0,0 +1,154 @@
+import hashlib
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+CACHE_VERSION = 6
+HASH_CHUNK = 1 << 20
+
+_hash_memo = {}
+
+
+def default_cache_dir() -> Path:
+    env = os.environ.get("WBS_IFC_CACHE_DIR")
+    if env:
+        return Path(env)
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or Path.home() / "AppData" / "Local"
+        return Path(base) / "WBSFillingFromIFC" / "cache"
+    if sys.platform == "darwin":
+        return Path.home() / "Library" / "Caches" / "WBSFillingFromIFC"
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "wbs_filling_from_ifc"
+
+
+def file_fingerprint(path) -> dict:
+    path = Path(path).resolve()
+    st = path.stat()
+    memo_key = (str(path), st.st_size, st.st_mtime_ns)
+    digest = _hash_memo.get(memo_key)
+    if digest is None:
+        h = hashlib.blake2b(digest_size=20)
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+                h.update(chunk)
+        digest = h.hexdigest()
+        _hash_memo[memo_key] = digest
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha": digest}
+
+
+class ModelIndexCache:
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = Path(cache_dir) if cache_dir else default_cache_dir()
+
+    def _entry_path(self, fingerprint: dict) -> Path:
+        return self.cache_dir / f"{fingerprint['sha']}-{fingerprint['size']}.idx"
+
+    def load(self, fingerprint: dict):
+        path = self._entry_path(fingerprint)
+        try:
+            with open(path, "rb") as f:
+                snapshot = pickle.load(f)
+        except Exception:
+            return None
+        if snapshot.get("version") != CACHE_VERSION:
+            return None
+        if snapshot.get("sha") != fingerprint["sha"]:
+            return None
+        return snapshot
+
+    def save(self, fingerprint: dict, snapshot: dict) -> bool:
+        snapshot = {**snapshot, "version": CACHE_VERSION, "sha": fingerprint["sha"]}
+        return _write_pickle(self.cache_dir, self._entry_path(fingerprint), snapshot)
+
+    def clear(self):
+        _clear_entries(self.cache_dir, "*.idx")
+
+
+class ResultCache:
+    # Rule results per model: a directory per model fingerprint (and cache
+    # version) holding one file per rule key with its evaluate_rule() result.
+    # Results only hold plain values, so an entry stays valid for as long as
+    # the model and the compiled rule do. Entries are read and written one at
+    # a time, so memory does not grow with the number of cached records.
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = Path(cache_dir) if cache_dir else default_cache_dir()
+
+    def _model_dir(self, fingerprint: dict) -> Path:
+        return self.cache_dir / f"{fingerprint['sha']}-{fingerprint['size']}-v{CACHE_VERSION}.res"
+
+    def keys(self, fingerprint: dict) -> set:
+        model_dir = self._model_dir(fingerprint)
+        if not model_dir.is_dir():
+            return set()
+        return {p.stem for p in model_dir.glob("*.pkl")}
+
+    def get(self, fingerprint: dict, key: str):
+        try:
+            with open(self._model_dir(fingerprint) / f"{key}.pkl", "rb") as f:
+                return pickle.load(f)
+        except Exception:
+            return None
+
+    def put(self, fingerprint: dict, key: str, result: dict) -> bool:
+        model_dir = self._model_dir(fingerprint)
+        return _write_pickle(model_dir, model_dir / f"{key}.pkl", result)
+
+    def prune(self, fingerprint: dict, keep: set):
+        # Keeps only the rules of the latest complete run, so the entry
+        # follows the mapping instead of growing with every edit, and drops
+        # entries of other cache versions for the same model.
+        model_dir = self._model_dir(fingerprint)
+        for p in model_dir.glob("*.pkl") if model_dir.is_dir() else ():
+            if p.stem not in keep:
+                _unlink(p)
+        for other in self.cache_dir.glob(f"{fingerprint['sha']}-{fingerprint['size']}*.res"):
+            if other != model_dir:
+                _remove(other)
+
+    def clear(self):
+        _clear_entries(self.cache_dir, "*.res")
+
+
+def _write_pickle(cache_dir: Path, path: Path, obj) -> bool:
+    tmp = None
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+        return True
+    except Exception:
+        if tmp:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+        return False
+
+
+def _unlink(path: Path):
+    try:
+        path.unlink()
+    except OSError:
+        pass
+
+
+def _remove(path: Path):
+    if path.is_dir():
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        _unlink(path)
+
+
+def _clear_entries(cache_dir: Path, pattern: str):
+    if not cache_dir.is_dir():
+        return
+    for p in cache_dir.glob(pattern):
+        _remove(p)
@@ -0,0 +1,114 @@
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+from app.core.property_columns import PropertyColumns
+from app.core.structural_engine import IFCInvestigator
+
+MODEL_BUSY_MSG = "O modelo IFC está ocupado (relatório ou carregamento em curso). Tente novamente quando terminar."
+
+
+def model_key(path) -> tuple:
+    p = Path(path).resolve()
+    st = p.stat()
+    return (str(p), st.st_mtime_ns, st.st_size)
+
+
+class ModelRegistry:
+
+    def __init__(self, inv: IFCInvestigator | None = None):
+        self.inv = inv if inv is not None else IFCInvestigator()
+        self._key = None
+        self._loaded_file = None
+        self._lock = threading.RLock()
+        self._build = None
+        self.opens = 0
+
+    @contextmanager
+    def using(self, blocking: bool = True):
+        # Every use of the shared investigator (loads, report runs, previews)
+        # goes through this lock. A non-blocking caller gets None while the
+        # model is busy and is expected to try again later.
+        if not self._lock.acquire(blocking=blocking):
+            yield None
+            return
+        try:
+            yield self.inv
+        finally:
+            self._lock.release()
+
+    def is_loaded(self, path) -> bool:
+        try:
+            key = model_key(path)
+        except OSError:
+            return False
+        with self._lock:
+            return self._is_current(key)
+
+    def _is_current(self, key) -> bool:
+        return (
+            self._key == key
+            and self._loaded_file is not None
+            and self.inv.ifc_file is self._loaded_file
+        )
+
+    def open(self, path, indexed: bool = False) -> IFCInvestigator:
+        if not path:
+            raise ValueError("Caminho IFC vazio.")
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"IFC não encontrado: {path}")
+        key = model_key(path)
+        with self._lock:
+            if not self._is_current(key):
+                self._build = None
+                self.inv.open_ifc(str(path), indexed=indexed)
+                self._key = key
+                self._loaded_file = self.inv.ifc_file
+                self.opens += 1
+            elif indexed:
+                if self._build is not None:
+                    self._finish_build()
+                self.inv.build_property_columns()
+            return self.inv
+
+    def build_columns(self) -> bool:
+        # Background build of the property columns of the loaded model. The
+        # file is only read under the lock, one IFC class per acquisition, so
+        # previews keep running on the value indexes in between. The build in
+        # flight is kept on the registry: open(indexed=True) finishes it
+        # instead of starting over, and a new model abandons it.
+        with self._lock:
+            if (self.inv.ifc_file is None or self.inv.property_columns is not None
+                    or self._build is not None):
+                return False
+            build = self._build = _ColumnsBuild(self.inv.ifc_file, self.inv.index_by_class)
+        while True:
+            with self._lock:
+                if self._build is not build:
+                    return False
+                if build.pending:
+                    build.step()
+                    continue
+                return self._finish_build()
+
+    def _finish_build(self) -> bool:
+        build, self._build = self._build, None
+        if self.inv.ifc_file is not build.ifc_file or self.inv.property_columns is not None:
+            return False
+        while build.pending:
+            build.step()
+        self.inv.set_property_columns(build.columns)
+        return True
+
+
+class _ColumnsBuild:
+
+    def __init__(self, ifc_file, index_by_class: dict):
+        self.ifc_file = ifc_file
+        self.pending = list(index_by_class.items())
+        self.columns = PropertyColumns()
+
+    def step(self):
+        etype, elems = self.pending.pop(0)
+        self.columns.add_class(etype, elems)
@@ -0,0 +1,244 @@
+import math
+from collections import OrderedDict
+
+import numpy as np
+import ifcopenshell.util.element
+
+DERIVED_CACHE_SIZE = 256
+
+_TRUE_TOKENS  = ("TRUE", ".T.", "T", "1", "YES")
+_FALSE_TOKENS = ("FALSE", ".F.", "F", "0", "NO")
+
+_BOOL_TEXT = {
+    ".t.": "true", "t": "true", "1": "true", "yes": "true",
+    ".f.": "false", "f": "false", "0": "false", "no": "false",
+}
+
+
+def bool_from_ifc(v) -> bool | None:
+    if isinstance(v, bool):
+        return v
+    if v is None:
+        return None
+    s = str(v).strip().upper()
+    if s in _TRUE_TOKENS:
+        return True
+    if s in _FALSE_TOKENS:
+        return False
+    return None
+
+
+def normalize_text(v) -> str:
+    s = str(v).strip().lower()
+    return _BOOL_TEXT.get(s, s)
+
+
+def to_float(v) -> float:
+    try:
+        return float(v)
+    except (ValueError, TypeError):
+        return math.nan
+
+
+def quantity_float(v) -> float:
+    if v is None:
+        return math.nan
+    try:
+        return float(str(v))
+    except (ValueError, TypeError):
+        return math.nan
+
+
+def predefined_type(element) -> str:
+    # Elements without a PredefinedType (unset, or a class without the
+    # attribute) are filed under NOTDEFINED, the value the mapping page offers.
+    pre = getattr(element, "PredefinedType", None)
+    return str(pre).strip().upper() if pre else "NOTDEFINED"
+
+
+def prop_predicate(ff: dict):
+    pset = ff.get("pset", "")
+    prop = ff.get("prop", "")
+    val  = ff.get("value")
+    if not pset or not prop or val is None:
+        return None
+    if isinstance(val, bool):
+        return ("bool", pset, prop, val)
+    if isinstance(val, (int, float)):
+        return ("num", pset, prop, float(val))
+    return ("text", pset, prop, normalize_text(val))
+
+
+def predicate_key(kind: str, value):
+    if kind == "bool":
+        return bool_from_ifc(value)
+    if kind == "num":
+        num = to_float(value)
+        return None if math.isnan(num) else num
+    return normalize_text(value)
+
+
+def predicate_matches(pred: tuple, value) -> bool:
+    kind, _, _, want = pred
+    if kind == "bool":
+        return bool_from_ifc(value) == want
+    if kind == "num":
+        try:
+            return float(value) == want
+        except (ValueError, TypeError):
+            return False
+    return normalize_text(value) == want
+
+
+class BoundedMemo(OrderedDict):
+    # Dict keeping at most max_size entries, evicting the least recently used.
+
+    def __init__(self, max_size: int):
+        super().__init__()
+        self.max_size = max_size
+
+    def get(self, key, default=None):
+        if key not in self:
+            return default
+        self.move_to_end(key)
+        return self[key]
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.move_to_end(key)
+        while len(self) > self.max_size:
+            self.popitem(last=False)
+
+
+class PropertyColumns:
+
+    def __init__(self):
+        self._raw = {}
+        self._size = {}
+        self._derived = BoundedMemo(DERIVED_CACHE_SIZE)
+        self._attrs = {}
+        self._pos_by_id = {}
+
+    @classmethod
+    def build(cls, index_by_class: dict, get_psets=None):
+        cols = cls()
+        for etype, elems in index_by_class.items():
+            cols.add_class(etype, elems, get_psets)
+        return cols
+
+    def add_class(self, etype: str, elems: list, get_psets=None):
+        get_psets = get_psets or ifcopenshell.util.element.get_psets
+        n = len(elems)
+        raw = {}
+        predefs = np.empty(n, dtype=object)
+        objtypes = np.empty(n, dtype=object)
+        for pos, e in enumerate(elems):
+            try:
+                self._pos_by_id[e.id()] = (etype, pos)
+            except Exception:
+                pass
+            predefs[pos] = predefined_type(e)
+            objtypes[pos] = str(getattr(e, "ObjectType", "")).upper()
+            try:
+                psets = get_psets(e) or {}
+            except Exception:
+                psets = {}
+            for pset, props in psets.items():
+                for prop, v in (props or {}).items():
+                    col = raw.get((pset, prop))
+                    if col is None:
+                        col = raw[(pset, prop)] = np.full(n, None, dtype=object)
+                    col[pos] = v
+        self._raw[etype] = raw
+        self._size[etype] = n
+        self._attrs[etype] = {"predefined": predefs, "object_type": objtypes}
+
+    def snapshot(self) -> dict:
+        return {"raw": self._raw, "size": self._size,
+                "attrs": self._attrs, "pos_by_id": self._pos_by_id}
+
+    @classmethod
+    def from_snapshot(cls, state: dict):
+        cols = cls()
+        cols._raw = state["raw"]
+        cols._size = state["size"]
+        cols._attrs = state["attrs"]
+        cols._pos_by_id = state["pos_by_id"]
+        return cols
+
+    def __contains__(self, etype) -> bool:
+        return etype in self._raw
+
+    def keys(self, etype: str) -> list:
+        return sorted(self._raw.get(etype, {}).keys())
+
+    def has(self, etype: str, pset: str, prop: str) -> bool:
+        return (pset, prop) in self._raw.get(etype, {})
+
+    def clear_derived(self):
+        self._derived.clear()
+
+    def raw(self, etype: str, pset: str, prop: str) -> np.ndarray:
+        col = self._raw.get(etype, {}).get((pset, prop))
+        if col is None:
+            col = np.full(self._size.get(etype, 0), None, dtype=object)
+        return col
+
+    def _derive(self, kind: str, etype: str, pset: str, prop: str, fn, dtype):
+        key = (kind, etype, pset, prop)
+        arr = self._derived.get(key)
+        if arr is None:
+            arr = np.fromiter((fn(v) for v in self.raw(etype, pset, prop)),
+                              dtype=dtype, count=self._size.get(etype, 0))
+            # Names typed while editing a rule rarely exist; only real
+            # columns are kept.
+            if self.has(etype, pset, prop):
+                self._derived[key] = arr
+        return arr
+
+    def booleans(self, etype: str, pset: str, prop: str) -> np.ndarray:
+        def _fold(v):
+            b = bool_from_ifc(v)
+            return -1 if b is None else int(b)
+        return self._derive("bool", etype, pset, prop, _fold, np.int8)
+
+    def numbers(self, etype: str, pset: str, prop: str) -> np.ndarray:
+        return self._derive("num", etype, pset, prop, to_float, np.float64)
+
+    def quantities(self, etype: str, pset: str, prop: str) -> np.ndarray:
+        return self._derive("qty", etype, pset, prop, quantity_float, np.float64)
+
+    def texts(self, etype: str, pset: str, prop: str) -> np.ndarray:
+        return self._derive("text", etype, pset, prop, normalize_text, object)
+
+    def attr_mask(self, etype: str, predef=None, objtype=None) -> np.ndarray:
+        m = np.ones(self._size.get(etype, 0), dtype=bool)
+        attrs = self._attrs.get(etype, {})
+        if predef:
+            m &= attrs["predefined"] == predef
+        if predef == "USERDEFINED" and objtype:
+            m &= attrs["object_type"] == objtype.upper()
+        return m
+
+    def mask(self, etype: str, predef=None, objtype=None, extras=None, base=None) -> np.ndarray:
+        m = self.attr_mask(etype, predef, objtype) if base is None else base.copy()
+        for ff in extras or []:
+            pred = ff if isinstance(ff, tuple) else prop_predicate(ff)
+            if pred is None:
+                continue
+            kind, pset, prop, val = pred
+            if kind == "bool":
+                m &= self.booleans(etype, pset, prop) == int(val)
+            elif kind == "num":
+                m &= self.numbers(etype, pset, prop) == val
+            else:
+                m &= self.texts(etype, pset, prop) == val
+            if not m.any():
+                break
+        return m
+
+    def locate(self, element):
+        try:
+            return self._pos_by_id.get(element.id())
+        except Exception:
+            return None
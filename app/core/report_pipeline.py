@@ -0,0 +1,710 @@
+import csv
+import heapq
+import math
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+
+from app.gui.wbs_helpers import WBSIndex
+from app.core.detail_spool import DetailSpool
+from app.core.xlsx_writer import write_report_sheet
+from app.core.model_cache import ModelIndexCache, file_fingerprint
+from app.core.property_columns import predefined_type
+from app.core.run_stats import RULE_COUNTERS, RunStats
+from app.core.structural_engine import (
+    IFCInvestigator,
+    RuleCompileError,
+    compile_rule,
+    compile_rules,
+    rule_key,
+)
+
+CSV_HEADERS = [
+    "ifc_filename",
+    "wbs_codigo", "descricao",
+    "ifc_class", "predefinedtype", "objecttype",
+    "material",
+    "ifc_guid", "buildingstorey", "classification_code",
+    "ifc_project", "ifc_site", "ifc_building",
+    "ifc_valor", "unidade", "qty_type",
+]
+
+COL_QTY = "QDTE."
+COL_UNI = "UNID."
+COL_QNT = "QUANTIDADE"
+NOT_FOUND_TEXT = "[ELEMENTOS NÃO ENCONTRADOS]"
+
+SHARDS_PER_WORKER = 4
+MIN_CODES_PER_WORKER = 4
+
+
+def parse_wbs_code(code: str) -> tuple:
+    if not code or not isinstance(code, str):
+        return (float("inf"),)
+    parts = []
+    for part in code.split("."):
+        part = part.strip()
+        parts.append(int(part) if part.isdigit() else part)
+    return tuple(parts)
+
+
+def _sort_key(code):
+    return tuple(int(x) if x.isdigit() else x for x in code.split("."))
+
+
+def unique_output_path(out_dir: Path, stem: str, suffix: str) -> Path:
+    path = out_dir / f"{stem}{suffix}"
+    n = 1
+    while path.exists():
+        path = out_dir / f"{stem}({n}){suffix}"
+        n += 1
+    return path
+
+
+def _group_records(records: list) -> tuple[list, dict]:
+    seen = {}
+    grp_sums = {}
+    for rec in records:
+        sval = rec.get("group_value")
+        if not sval:
+            continue
+        if sval not in seen:
+            seen[sval] = len(seen)
+        grp_sums[sval] = grp_sums.get(sval, 0.0) + float(rec.get("value") or 0.0)
+    grp_vals = sorted(seen.keys(), key=lambda v: seen[v])
+    return grp_vals, grp_sums
+
+
+def _rule_stats(inv, before: dict, extract_s: float, details_s: float) -> dict:
+    after = inv.engine_counters()
+    stats = {name: int(after.get(name, 0)) - int(before.get(name, 0)) for name in RULE_COUNTERS}
+    return {"extract_s": extract_s, "details_s": details_s, **stats}
+
+
+def evaluate_rule(inv, rule) -> dict:
+    try:
+        plan = compile_rule(rule)
+    except RuleCompileError as e:
+        return {"error": str(e), "qty_type": "prop"}
+    qty_type = plan.qty_type
+    try:
+        before = inv.engine_counters()
+        t0 = time.perf_counter()
+        total, details, found_any = inv.extract_quantities(plan)
+        t1 = time.perf_counter()
+        if not found_any:
+            return {"found_any": False, "qty_type": qty_type, "total": 0.0,
+                    "records": [], "group_values": [], "group_sums": {},
+                    "stats": _rule_stats(inv, before, t1 - t0, 0.0)}
+
+        g_pset = plan.group_pset
+        g_prop = plan.group_prop
+
+        records = []
+        for det in details:
+            e = det.get("element")
+            ifc_cls = "n/a"; predef = "n/a"; objtype = "n/a"
+            if e is not None:
+                ifc_cls = e.is_a()
+                predef  = predefined_type(e)
+                objtype = str(getattr(e, "ObjectType", "n/a") or "n/a")
+
+            group_value = None
+            if g_pset and g_prop and e is not None:
+                try:
+                    gv = inv.get_psets(e).get(g_pset, {}).get(g_prop)
+                    if gv is not None:
+                        sv = str(gv).strip()
+                        group_value = sv if sv else None
+                except Exception:
+                    pass
+
+            records.append({
+                "guid":                det.get("guid", "n/a"),
+                "value":               det.get("valor"),
+                "ifc_class":           ifc_cls,
+                "predefined":          predef,
+                "objecttype":          objtype,
+                "material":            inv.get_element_material(e) if e else "n/a",
+                "classification_code": inv.get_classification_code(e) if e else "n/a",
+                "buildingstorey":      inv.get_building_storey(e) if e else "n/a",
+                "group_value":         group_value,
+            })
+
+        if g_pset and g_prop:
+            grp_vals, grp_sums = _group_records(records)
+        else:
+            grp_vals, grp_sums = [], {}
+
+        return {"found_any": True, "qty_type": qty_type, "total": total,
+                "records": records, "group_values": grp_vals, "group_sums": grp_sums,
+                "stats": _rule_stats(inv, before, t1 - t0, time.perf_counter() - t1)}
+    except Exception as e:
+        return {"error": str(e), "qty_type": qty_type}
+
+
+_worker_inv = None
+
+
+def default_workers() -> int:
+    return max(1, (os.cpu_count() or 1) - 1)
+
+
+def _init_worker(ifc_path: str, indexed: bool, cache_dir=None):
+    global _worker_inv
+    _worker_inv = IFCInvestigator(
+        index_cache=ModelIndexCache(cache_dir) if cache_dir else None,
+    )
+    _worker_inv.open_ifc(ifc_path, indexed=indexed)
+
+
+def _evaluate_shard(shard: list) -> list:
+    return [(code, evaluate_rule(_worker_inv, rule)) for code, rule in shard]
+
+
+def _pool_workers(workers: int, n_codes: int) -> int:
+    return min(workers, n_codes // MIN_CODES_PER_WORKER)
+
+
+def evaluate_rules(inv, rules: dict, ifc_path=None, workers: int = 1, index_cache=None):
+    codes = sorted(rules.keys(), key=_sort_key)
+    workers = _pool_workers(workers, len(codes))
+    if workers <= 1 or not ifc_path:
+        for code in codes:
+            yield code, evaluate_rule(inv, rules[code])
+        return
+
+    # Contiguous shards keep neighbouring codes (which usually query the same
+    # classes) on the same worker; map() returns them in submission order.
+    n_shards = min(len(codes), workers * SHARDS_PER_WORKER)
+    size = math.ceil(len(codes) / n_shards)
+    shards = [[(c, rules[c]) for c in codes[i:i + size]]
+              for i in range(0, len(codes), size)]
+    indexed = inv is None or inv.property_columns is not None
+    index_cache = getattr(inv, "index_cache", index_cache)
+    cache_dir = str(index_cache.cache_dir) if index_cache is not None else None
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(str(ifc_path), indexed, cache_dir),
+    ) as pool:
+        for shard_result in pool.map(_evaluate_shard, shards):
+            yield from shard_result
+
+
+def evaluate_rules_cached(inv, rules: dict, ifc_path=None, workers: int = 1,
+                          result_cache=None, log=print, open_model=None, index_cache=None):
+    # inv may be None when open_model is given: the model is then opened only
+    # if a rule has to be evaluated in this process, so a run served by the
+    # cache or by the worker pool never parses it here.
+    def investigator():
+        nonlocal inv
+        if inv is None and open_model is not None:
+            inv = open_model()
+        return inv
+
+    def evaluate(pending: dict):
+        in_pool = bool(ifc_path) and _pool_workers(workers, len(pending)) > 1
+        model = inv if in_pool or not pending else investigator()
+        return evaluate_rules(model, pending, ifc_path=ifc_path, workers=workers,
+                              index_cache=index_cache)
+
+    fingerprint = None
+    if result_cache is not None and ifc_path:
+        try:
+            fingerprint = file_fingerprint(ifc_path)
+        except OSError:
+            pass
+    if fingerprint is None:
+        yield from evaluate(rules)
+        return
+
+    stored = result_cache.keys(fingerprint)
+    keys   = {code: rule_key(rule) for code, rule in rules.items()}
+    hits   = sorted((code for code, k in keys.items() if k in stored), key=_sort_key)
+    misses = {code: rule for code, rule in rules.items() if keys[code] not in stored}
+    log(f"Cache de resultados: {len(hits)} regra(s) reutilizada(s), {len(misses)} a avaliar")
+
+    def cached():
+        # Entries are read as they are merged; one that can no longer be
+        # read is evaluated in place.
+        for code in hits:
+            res = result_cache.get(fingerprint, keys[code])
+            if res is None:
+                res = evaluate_rule(investigator(), rules[code])
+                _store(code, res)
+            yield code, res
+
+    def _store(code, res):
+        # Timings are per run and are not stored, so cached results come
+        # back without "stats".
+        if "error" not in res:
+            result_cache.put(fingerprint, keys[code],
+                             {k: v for k, v in res.items() if k != "stats"})
+
+    # Each fresh result is written as soon as it arrives, so a run that
+    # stops early keeps the work done so far.
+    for code, res in heapq.merge(cached(), evaluate(misses), key=lambda item: _sort_key(item[0])):
+        if code in misses:
+            _store(code, res)
+        yield code, res
+    result_cache.prune(fingerprint, set(keys.values()))
+
+
+def _progress_event(done: int, total: int, elements: int, elapsed: float) -> dict:
+    eta = elapsed / done * (total - done) if done else None
+    return {"done": done, "total": total, "elements": elements, "eta_s": eta}
+
+
+def _build_output_table(df_export, lvl, wbs_index, rules, no_elements_codes,
+                        code_to_desc_idx, code_to_qty, code_to_unit,
+                        code_to_groupvals, code_to_groupqtys, col_wbs, col_desc):
+    no_elements = set(no_elements_codes)
+    include_all, include_found = set(), set()
+    for code in rules:
+        parts = code.split(".")
+        prefixes = {".".join(parts[:k]) for k in range(1, len(parts) + 1)}
+        include_all |= prefixes
+        if code not in no_elements:
+            include_found |= prefixes
+
+    frame     = df_export.reset_index(drop=True).astype(object)
+    n         = len(frame)
+    wbs_vals  = pd.Series([str(v or "").strip() for v in frame[col_wbs].tolist()], dtype=object)
+    is_desc10 = pd.Series(lvl.to_numpy()[:n] == 10)
+    parent    = pd.Series(
+        {i: c for c, i in code_to_desc_idx.items() if i < n}, dtype=object
+    ).reindex(range(n))
+    has_parent = parent.notna()
+    parent_nf  = parent.isin(no_elements)
+
+    keep_all   = (is_desc10 & has_parent) | (~is_desc10 & wbs_vals.isin(include_all))
+    keep_found = (is_desc10 & has_parent & ~parent_nf) | (~is_desc10 & wbs_vals.isin(include_found))
+
+    base = frame.loc[keep_all].copy()
+    base[COL_QTY] = ""
+    desc    = is_desc10[base.index]
+    desc    = desc[desc].index
+    parents = parent[desc]
+    grouped = parents.map(lambda c: bool(code_to_groupvals.get(c))).astype(bool)
+    nf      = parent_nf[desc]
+    qty     = parents.map(lambda c: code_to_qty.get(c, "")).astype(object)
+    unit    = parents.map(lambda c: code_to_unit.get(c, "")).astype(object)
+    base.loc[desc, col_wbs] = parents + ".01"
+    base.loc[desc, COL_QTY] = qty.where(~(nf | grouped), "")
+    base.loc[desc, COL_QNT] = qty.where(~grouped, "").where(~nf, NOT_FOUND_TEXT)
+    base.loc[desc, COL_UNI] = unit.where(~nf, "")
+    base["_pos"]   = base.index
+    base["_sub"]   = 0
+    base["_kind"]  = "wbs"
+    base.loc[desc, "_kind"] = "desc10"
+    base["_found"] = keep_found[base.index]
+    base["_warn"]  = False
+    base.loc[desc, "_warn"] = nf
+
+    blank = {c: "" for c in frame.columns}
+    extra = []
+    code_extensions = {}
+    for pos, code in parents.items():
+        desc_ext   = f"{code}.01"
+        group_vals = code_to_groupvals.get(code) or []
+        groups_map = {str(g): f"{desc_ext}.{k:02d}" for k, g in enumerate(group_vals, start=1)}
+        code_extensions[code] = {"desc": desc_ext, "groups": groups_map}
+        sums = code_to_groupqtys.get(code, {})
+        for k, gval in enumerate(group_vals, start=1):
+            q = sums.get(str(gval), 0.0)
+            extra.append({**blank, col_wbs: groups_map[str(gval)], col_desc: str(gval),
+                          COL_QTY: q, COL_QNT: q, COL_UNI: code_to_unit.get(code, ""),
+                          "_pos": pos, "_sub": k, "_kind": "insert", "_found": True,
+                          "_warn": False})
+
+    present = {str(v).strip() for v in base[col_wbs]} | {r[col_wbs] for r in extra}
+    handled = set(parent.dropna())
+    tail_pos = n
+    for code in no_elements_codes:
+        if code in handled:
+            continue
+        parts = code.split(".")
+        for k in range(1, len(parts) + 1):
+            anc = ".".join(parts[:k])
+            if anc in present:
+                continue
+            anc_idx = wbs_index.first_row(anc)
+            if anc_idx is not None:
+                extra.append({**frame.iloc[anc_idx].to_dict(), COL_QTY: "",
+                              "_pos": tail_pos, "_sub": 0, "_kind": "wbs", "_found": False,
+                              "_warn": False})
+                present.add(anc)
+                tail_pos += 1
+        desc_ext = f"{code}.01"
+        extra.append({**blank, col_wbs: desc_ext, COL_QNT: NOT_FOUND_TEXT,
+                      "_pos": tail_pos, "_sub": 0, "_kind": "desc10", "_found": False,
+                      "_warn": True})
+        present.add(desc_ext)
+        tail_pos += 1
+        code_extensions[code] = {"desc": desc_ext, "groups": {}}
+
+    table = base
+    if extra:
+        table = pd.concat([base, pd.DataFrame(extra, columns=base.columns, dtype=object)])
+    table = table.sort_values(["_pos", "_sub"], kind="mergesort").reset_index(drop=True)
+    return table, code_extensions
+
+
+def generate_report(inv, rules: dict, df_raw, wbs_cols: dict, ifc_path: str,
+                    out_dir, log=print, workers: int = 1, spool_dir=None,
+                    wbs_index: WBSIndex | None = None, result_cache=None,
+                    stats: RunStats | None = None, progress=None) -> dict:
+    col_wbs   = wbs_cols.get("col_wbs")
+    col_desc  = wbs_cols.get("col_desc")
+    if wbs_index is None or not wbs_index.is_current(df_raw):
+        wbs_index = WBSIndex(df_raw, wbs_cols)
+    if stats is None:
+        stats = RunStats()
+
+    with stats.span("compile_rules"):
+        plans, rule_errors = compile_rules(rules)
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    project_info = inv.get_project_info()
+    ifc_project  = project_info.get("project",  "n/a")
+    ifc_site     = project_info.get("site",     "n/a")
+    ifc_building = project_info.get("building", "n/a")
+
+    code_to_qty:       dict[str, float] = {}
+    code_to_groupvals: dict[str, list]  = {}
+    code_to_groupqtys: dict[str, dict]  = {}
+    code_to_desc_idx:  dict[str, int]   = {}
+    code_to_unit:      dict[str, str]   = {}
+    no_elements_codes: list[str]         = []
+    found_codes:       list[str]         = []
+    spool = DetailSpool(spool_dir)
+
+    log("\nExtraindo quantidades por código WBS:")
+    for code, msg in rule_errors.items():
+        log(f" - {code}: regra inválida ({msg})")
+
+    t_eval = time.perf_counter()
+    done = elements = 0
+    if progress is not None:
+        progress(_progress_event(0, len(plans), 0, 0.0))
+    for code, res in evaluate_rules_cached(inv, plans, ifc_path=ifc_path, workers=workers,
+                                           result_cache=result_cache, log=log):
+        qty_type = res.get("qty_type", "prop")
+        done += 1
+        elements += len(res.get("records") or [])
+        if progress is not None:
+            progress(_progress_event(done, len(plans), elements, time.perf_counter() - t_eval))
+
+        if "error" in res:
+            log(f" - {code}: erro ({res['error']})")
+            continue
+        stats.record_rule(code, res)
+
+        if not res["found_any"]:
+            no_elements_codes.append(code)
+            code_to_qty[code] = 0.0
+            log(f" - {code}: [ELEMENTOS NÃO ENCONTRADOS]")
+            desc_idx = wbs_index.desc_row(code)
+            if desc_idx is not None:
+                code_to_desc_idx[code] = desc_idx
+                code_to_unit[code] = wbs_index.desc_and_unit(code)[1]
+            continue
+
+        total = res["total"]
+        code_to_qty[code] = float(total)
+        log(f" - {code}: {total}" + (" (contagem)" if qty_type == "count" else ""))
+
+        code_to_groupvals[code] = res["group_values"]
+        code_to_groupqtys[code] = res["group_sums"]
+
+        desc_idx = wbs_index.desc_row(code)
+        if desc_idx is not None:
+            code_to_desc_idx[code] = desc_idx
+            code_to_unit[code]     = wbs_index.desc_and_unit(code)[1]
+
+        if res["records"]:
+            found_codes.append(code)
+            spool.write(code, res["records"], qty_type)
+    stats.add_time("evaluate", time.perf_counter() - t_eval)
+
+    if no_elements_codes:
+        log(f"\n⚠  Sem elementos encontrados para {len(no_elements_codes)} código(s):")
+        for c in no_elements_codes:
+            log(f"    • {c}")
+
+    df      = df_raw.copy()
+    lvl     = wbs_index.levels
+    col_qty = COL_QTY
+    col_uni = COL_UNI
+
+    for c in (col_qty, col_uni):
+        if c not in df.columns:
+            df[c] = ""
+
+    col_unidades = wbs_cols.get("col_unidades", col_uni)
+    if col_unidades and col_unidades in df.columns and col_unidades != col_uni:
+        df[col_uni] = df[col_unidades]
+
+    keep_cols = [col_wbs, col_desc, col_qty, col_uni]
+    df_export = df[[c for c in keep_cols if c in df.columns]].copy()
+    if col_uni not in df_export.columns and col_unidades in df_export.columns:
+        df_export = df_export.rename(columns={col_unidades: col_uni})
+
+    df_export[COL_QNT] = ""
+    with stats.span("output_table"):
+        table, code_extensions = _build_output_table(
+            df_export, lvl, wbs_index, rules, no_elements_codes, code_to_desc_idx,
+            code_to_qty, code_to_unit, code_to_groupvals, code_to_groupqtys,
+            col_wbs, col_desc,
+        )
+
+    cols_full  = list(df_export.columns)
+    cols_found = [c for c in cols_full if c != COL_QNT]
+
+    found = table[table["_found"].astype(bool)]
+
+    ifc_stem = Path(ifc_path).stem if ifc_path else "output"
+
+    out_path_found = unique_output_path(out_dir, f"MapaQuantidadesTrabalhos_{ifc_stem}", ".xlsx")
+    with stats.span("xlsx_mqt"):
+        write_report_sheet(out_path_found, found[cols_found].infer_objects(),
+                           found["_kind"].tolist(), found["_warn"].tolist())
+    stats.count("rows_mqt", len(found))
+    log(f"\n✓ MQT_{ifc_stem}.xlsx exportado")
+
+    out_path_full = unique_output_path(out_dir, f"ElementosVerificados_{ifc_stem}", ".xlsx")
+    with stats.span("xlsx_verified"):
+        write_report_sheet(out_path_full, table[cols_full].infer_objects(),
+                           table["_kind"].tolist(), table["_warn"].tolist())
+    stats.count("rows_verified", len(table))
+    log(f"✓ WBS_ElementosMapeados_{ifc_stem}.xlsx exportado")
+
+    wbs_rows = wbs_index.wbs_rows()
+
+    spool.close()
+    stats.count("records", spool.count)
+
+    log(f"Detalhes recolhidos: {spool.count} elementos")
+    if no_elements_codes:
+        log(f"⚠  Códigos sem elementos: {len(no_elements_codes)}")
+
+    for line in stats.summary_lines():
+        log(line)
+    run_report_path = stats.write_json(
+        unique_output_path(out_dir, f"RelatorioExecucao_{ifc_stem}", ".json"))
+    log(f"✓ {run_report_path.name} exportado")
+
+    return {
+        "mqt_path":          out_path_found,
+        "verified_path":     out_path_full,
+        "run_report_path":   run_report_path,
+        "stats":             stats,
+        "no_elements_codes": no_elements_codes,
+        "code_extensions":   code_extensions,
+        "csv_cache": {
+            "headers":       list(CSV_HEADERS),
+            "wbs_rows":      wbs_rows,
+            "meta": {
+                "ifc_project":  ifc_project,
+                "ifc_site":     ifc_site,
+                "ifc_building": ifc_building,
+            },
+            "found_codes":   found_codes,
+            "spool":         spool,
+            "code_to_unit":  code_to_unit,
+        },
+    }
+
+
+ELEMENT_FIELDS = [
+    ("ifc_class",           "ifc_class"),
+    ("predefinedtype",      "predefined"),
+    ("objecttype",          "objecttype"),
+    ("material",            "material"),
+    ("ifc_guid",            "guid"),
+    ("buildingstorey",      "buildingstorey"),
+    ("classification_code", "classification_code"),
+    ("ifc_valor",           "value"),
+    ("qty_type",            "qty_type"),
+]
+
+
+def _element_blocks(cache: dict, code_ext: dict, ifc_stem: str):
+    headers         = [h for h in cache["headers"] if h != "wbs_group"]
+    spool           = cache["spool"]
+    meta            = cache.get("meta", {})
+    units_by_parent = cache.get("code_to_unit", {})
+    wbs_rows        = cache.get("wbs_rows", [])
+    ifc_filename    = ifc_stem
+
+    ancestor_codes = set()
+    for code in cache.get("found_codes", []):
+        parts = code.split(".")
+        for k in range(1, len(parts)):
+            ancestor_codes.add(".".join(parts[:k]))
+
+    col = {h: i for i, h in enumerate(headers)}
+    blank = [""] * len(headers)
+
+    def _row(**values):
+        row = blank[:]
+        for h, v in values.items():
+            if h in col:
+                row[col[h]] = v
+        return row
+
+    desc_by_code = {}
+    ancestor_blocks = []
+    for entry in wbs_rows:
+        code = entry.get("wbs_codigo", "")
+        desc_by_code.setdefault(code, entry.get("descricao", ""))
+        if code in ancestor_codes:
+            row = _row(wbs_codigo=code, descricao=entry.get("descricao", ""))
+            ancestor_blocks.append((parse_wbs_code(code), [row]))
+    ancestor_blocks.sort(key=lambda b: b[0])
+
+    fields = [(col[h], key) for h, key in ELEMENT_FIELDS if h in col]
+    i_code, i_desc = col.get("wbs_codigo"), col.get("descricao")
+
+    def _parent_blocks():
+        # The spool holds one contiguous block per WBS code in WBS order, so
+        # only the elements of the code being written are held in memory.
+        # Rows are merged and written per group: all rows of a group share
+        # one WBS code, hence one sort key.
+        for parent, records in spool.iter_codes():
+            desc_ext  = code_ext.get(parent, {}).get("desc", f"{parent}.01")
+            group_map = code_ext.get(parent, {}).get("groups", {})
+
+            yield parse_wbs_code(desc_ext), [_row(
+                ifc_filename=ifc_filename, wbs_codigo=desc_ext,
+                descricao=desc_by_code.get(parent, ""),
+            )]
+
+            groups = {}
+            for rec in records:
+                groups.setdefault(rec["group_value"] or "n/a", []).append(rec)
+            if group_map:
+                sorted_groups = sorted(
+                    groups.items(),
+                    key=lambda kv: (kv[0] not in group_map,
+                                    parse_wbs_code(group_map.get(kv[0], "")))
+                )
+            else:
+                sorted_groups = list(groups.items())
+
+            template = _row(
+                ifc_filename=ifc_filename,
+                ifc_project=meta.get("ifc_project",  "n/a"),
+                ifc_site=meta.get("ifc_site",     "n/a"),
+                ifc_building=meta.get("ifc_building", "n/a"),
+                unidade=units_by_parent.get(parent, ""),
+            )
+
+            for gi, (gval, elems) in enumerate(sorted_groups, start=1):
+                element_code = group_map.get(gval) or f"{desc_ext}.{gi:02d}"
+                block = []
+                for el in elems:
+                    row = template[:]
+                    if i_code is not None:
+                        row[i_code] = element_code
+                    if i_desc is not None:
+                        row[i_desc] = gval or "n/a"
+                    for i, key in fields:
+                        row[i] = el[key]
+                    block.append(row)
+                yield parse_wbs_code(element_code), block
+
+    return headers, heapq.merge(ancestor_blocks, _parent_blocks(), key=lambda b: b[0])
+
+
+def export_elements_csv(cache: dict, code_ext: dict, out_dir, ifc_stem: str) -> Path:
+    headers, blocks = _element_blocks(cache, code_ext, ifc_stem)
+    out_csv = unique_output_path(Path(out_dir), f"ElementosQuantificados_{ifc_stem}", ".csv")
+
+    with open(out_csv, "w", newline="", encoding="utf-8-sig") as f:
+        w = csv.writer(f)
+        w.writerow(headers)
+        for _, block in blocks:
+            w.writerows(block)
+
+    return out_csv
+
+
+PARQUET_FLOAT_COLUMNS       = {"ifc_valor"}
+PARQUET_CATEGORICAL_COLUMNS = {"ifc_class", "material", "buildingstorey"}
+
+
+def parquet_available() -> bool:
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def export_elements_parquet(cache: dict, code_ext: dict, out_dir, ifc_stem: str) -> Path:
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError(
+            "A exportação Parquet requer o pacote pyarrow (pip install pyarrow)."
+        ) from None
+
+    headers, blocks = _element_blocks(cache, code_ext, ifc_stem)
+    fields = []
+    for h in headers:
+        if h in PARQUET_FLOAT_COLUMNS:
+            fields.append(pa.field(h, pa.float64()))
+        elif h in PARQUET_CATEGORICAL_COLUMNS:
+            fields.append(pa.field(h, pa.dictionary(pa.int32(), pa.string())))
+        else:
+            fields.append(pa.field(h, pa.string()))
+    schema = pa.schema(fields)
+
+    def _table(rows):
+        columns = list(zip(*rows))
+        arrays = []
+        for h, values in zip(headers, columns):
+            if h in PARQUET_FLOAT_COLUMNS:
+                arrays.append(pa.array([_to_float(v) for v in values], pa.float64()))
+            elif h in PARQUET_CATEGORICAL_COLUMNS:
+                arrays.append(pa.array(values, pa.string()).dictionary_encode())
+            else:
+                arrays.append(pa.array(values, pa.string()))
+        return pa.Table.from_arrays(arrays, schema=schema)
+
+    out_path = unique_output_path(Path(out_dir), f"ElementosQuantificados_{ifc_stem}", ".parquet")
+    i_code = headers.index("wbs_codigo")
+
+    # One row group per WBS chapter (first code segment); blocks arrive in
+    # WBS order, so each chapter is contiguous.
+    with pq.ParquetWriter(str(out_path), schema) as writer:
+        chapter, rows = None, []
+        for _, block in blocks:
+            for row in block:
+                ch = str(row[i_code]).split(".")[0]
+                if ch != chapter and rows:
+                    writer.write_table(_table(rows), row_group_size=len(rows))
+                    rows = []
+                chapter = ch
+                rows.append(row)
+        if rows:
+            writer.write_table(_table(rows), row_group_size=len(rows))
+
+    return out_path
@@ -0,0 +1,154 @@
+import csv
+from pathlib import Path
+
+import pandas as pd
+
+from app.core.model_cache import ModelIndexCache
+from app.core.report_pipeline import (
+    evaluate_rules_cached,
+    parse_wbs_code,
+    unique_output_path,
+)
+from app.core.structural_engine import IFCInvestigator, compile_rules
+from app.core.xlsx_writer import write_report_sheet
+
+DIFF_COLUMNS = [
+    "WBS", "QDTE. ANTERIOR", "QDTE. NOVA", "DIFERENÇA",
+    "ADICIONADOS", "REMOVIDOS", "ALTERADOS",
+]
+
+DIFF_CSV_HEADERS = [
+    "wbs_codigo", "ifc_guid", "estado", "ifc_class",
+    "valor_anterior", "valor_novo", "diferenca", "qty_type",
+]
+
+ADDED   = "adicionado"
+REMOVED = "removido"
+CHANGED = "alterado"
+
+VALUE_TOLERANCE = 1e-9
+
+
+def evaluate_revision(ifc_path, plans: dict, log=print, workers: int = 1,
+                      index_cache=None, result_cache=None) -> dict:
+    # The revision is only parsed here when some rule misses the result cache
+    # and is left to this process; the worker pool opens its own copies.
+    def open_model():
+        inv = IFCInvestigator(index_cache=index_cache)
+        inv.open_ifc(str(ifc_path), indexed=True)
+        return inv
+
+    return dict(evaluate_rules_cached(None, plans, ifc_path=str(ifc_path), workers=workers,
+                                      result_cache=result_cache, log=log,
+                                      open_model=open_model, index_cache=index_cache))
+
+
+def _values_by_guid(res: dict) -> dict:
+    values = {}
+    for rec in res.get("records") or []:
+        guid = rec.get("guid")
+        entry = values.setdefault(guid, [0.0, rec.get("ifc_class", "n/a")])
+        entry[0] += float(rec.get("value") or 0.0)
+    return values
+
+
+def diff_rule(old: dict, new: dict) -> dict:
+    before = _values_by_guid(old)
+    after  = _values_by_guid(new)
+    elements = []
+    for guid in sorted(after.keys() - before.keys()):
+        value, cls = after[guid]
+        elements.append((guid, ADDED, cls, None, value))
+    for guid in sorted(before.keys() - after.keys()):
+        value, cls = before[guid]
+        elements.append((guid, REMOVED, cls, value, None))
+    for guid in sorted(before.keys() & after.keys()):
+        if abs(after[guid][0] - before[guid][0]) > VALUE_TOLERANCE:
+            elements.append((guid, CHANGED, after[guid][1], before[guid][0], after[guid][0]))
+
+    total_old = float(old.get("total") or 0.0) if old.get("found_any") else 0.0
+    total_new = float(new.get("total") or 0.0) if new.get("found_any") else 0.0
+    counts = {state: sum(1 for e in elements if e[1] == state) for state in (ADDED, REMOVED, CHANGED)}
+    return {
+        "qty_type":  new.get("qty_type") or old.get("qty_type", "prop"),
+        "old_total": total_old,
+        "new_total": total_new,
+        "delta":     total_new - total_old,
+        "counts":    counts,
+        "elements":  elements,
+    }
+
+
+def diff_revisions(old_results: dict, new_results: dict) -> tuple[dict, dict]:
+    diffs, errors = {}, {}
+    for code in sorted(old_results.keys() | new_results.keys(), key=parse_wbs_code):
+        old = old_results.get(code, {})
+        new = new_results.get(code, {})
+        msg = old.get("error") or new.get("error")
+        if msg:
+            errors[code] = msg
+            continue
+        diffs[code] = diff_rule(old, new)
+    return diffs, errors
+
+
+def write_diff_outputs(diffs: dict, out_dir, old_stem: str, new_stem: str) -> tuple[Path, Path]:
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    stem = f"{old_stem}_vs_{new_stem}"
+
+    rows, warns = [], []
+    for code, d in diffs.items():
+        c = d["counts"]
+        rows.append([code, d["old_total"], d["new_total"], d["delta"],
+                     c[ADDED], c[REMOVED], c[CHANGED]])
+        warns.append(abs(d["delta"]) > VALUE_TOLERANCE or any(c.values()))
+    df = pd.DataFrame(rows, columns=DIFF_COLUMNS)
+    xlsx_path = unique_output_path(out_dir, f"DiferencasRevisao_{stem}", ".xlsx")
+    write_report_sheet(xlsx_path, df, ["desc10"] * len(df), warns,
+                       sheet_name="Diferenças")
+
+    csv_path = unique_output_path(out_dir, f"DiferencasElementos_{stem}", ".csv")
+    with open(csv_path, "w", newline="", encoding="utf-8-sig") as f:
+        w = csv.writer(f)
+        w.writerow(DIFF_CSV_HEADERS)
+        for code, d in diffs.items():
+            for guid, state, cls, before, after in d["elements"]:
+                delta = (after or 0.0) - (before or 0.0)
+                w.writerow([code, guid, state, cls,
+                            "" if before is None else before,
+                            "" if after is None else after,
+                            delta, d["qty_type"]])
+    return xlsx_path, csv_path
+
+
+def generate_diff(rules: dict, old_ifc, new_ifc, out_dir, log=print, workers: int = 1,
+                  index_cache: ModelIndexCache | None = None, result_cache=None) -> dict:
+    plans, rule_errors = compile_rules(rules)
+    for code, msg in rule_errors.items():
+        log(f" - {code}: regra inválida ({msg})")
+
+    results = []
+    for label, path in (("anterior", old_ifc), ("nova", new_ifc)):
+        log(f"\nAvaliando revisão {label}: {Path(path).name}")
+        results.append(evaluate_revision(path, plans, log=log, workers=workers,
+                                         index_cache=index_cache, result_cache=result_cache))
+
+    diffs, errors = diff_revisions(*results)
+    for code, msg in errors.items():
+        log(f" - {code}: erro ({msg})")
+
+    changed = [c for c, d in diffs.items()
+               if abs(d["delta"]) > VALUE_TOLERANCE or any(d["counts"].values())]
+    log(f"\nCódigos com diferenças: {len(changed)} de {len(diffs)}")
+    for code in changed:
+        d = diffs[code]
+        c = d["counts"]
+        log(f" - {code}: {d['old_total']:g} → {d['new_total']:g} (Δ {d['delta']:+g};"
+            f" +{c[ADDED]} −{c[REMOVED]} ~{c[CHANGED]})")
+
+    xlsx_path, csv_path = write_diff_outputs(diffs, out_dir, Path(old_ifc).stem, Path(new_ifc).stem)
+    log(f"\n✓ {xlsx_path.name} exportado")
+    log(f"✓ {csv_path.name} exportado")
+    return {"diffs": diffs, "errors": errors, "changed_codes": changed,
+            "xlsx_path": xlsx_path, "csv_path": csv_path}
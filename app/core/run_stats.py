@@ -0,0 +1,125 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+SLOWEST_CODES = 10
+
+STAGE_LABELS = {
+    "ifc_open":      "Abertura do IFC",
+    "compile_rules": "Compilação das regras",
+    "evaluate":      "Avaliação das regras",
+    "rule_extract":  "  filtragem e quantidades",
+    "rule_details":  "  material, piso e classificação",
+    "output_table":  "Montagem da tabela",
+    "xlsx_mqt":      "Escrita MapaQuantidadesTrabalhos",
+    "xlsx_verified": "Escrita ElementosVerificados",
+}
+
+COUNTER_LABELS = {
+    "rules_evaluated":  "Regras avaliadas",
+    "rules_cached":     "Regras da cache",
+    "elements_scanned": "Elementos analisados",
+    "pset_calls":       "Leituras de psets",
+    "pset_cache_hits":  "Psets da cache",
+    "filter_memo_hits": "Filtros reutilizados",
+    "records":          "Elementos quantificados",
+    "rows_mqt":         "Linhas MapaQuantidadesTrabalhos",
+    "rows_verified":    "Linhas ElementosVerificados",
+}
+
+# Per-rule counters returned by evaluate_rule() under "stats".
+RULE_COUNTERS = ("elements_scanned", "pset_calls", "pset_cache_hits", "filter_memo_hits")
+
+
+class RunStats:
+    # Named spans (wall time and call count) and counters for one report run,
+    # aggregated over the run and per WBS code.
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._t0 = time.perf_counter()
+        self.started = datetime.now().isoformat(timespec="seconds")
+        self.spans = {}
+        self.counters = {}
+        self.codes = {}
+
+    @contextmanager
+    def span(self, name: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - t0)
+
+    def add_time(self, name: str, seconds: float, calls: int = 1):
+        with self._lock:
+            entry = self.spans.setdefault(name, [0.0, 0])
+            entry[0] += seconds
+            entry[1] += calls
+
+    def count(self, name: str, n: int = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def record_rule(self, code: str, res: dict):
+        rule_stats = res.get("stats")
+        if rule_stats is None:
+            self.count("rules_cached")
+            return
+        self.count("rules_evaluated")
+        self.add_time("rule_extract", rule_stats["extract_s"])
+        self.add_time("rule_details", rule_stats["details_s"])
+        for name in RULE_COUNTERS:
+            self.count(name, rule_stats.get(name, 0))
+        with self._lock:
+            self.codes[code] = {
+                "seconds":  rule_stats["extract_s"] + rule_stats["details_s"],
+                "elements": len(res.get("records") or []),
+                **{name: rule_stats.get(name, 0) for name in RULE_COUNTERS},
+            }
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self._t0
+
+    def slowest_codes(self, n: int = SLOWEST_CODES) -> list:
+        with self._lock:
+            ranked = sorted(self.codes.items(), key=lambda kv: kv[1]["seconds"], reverse=True)
+        return ranked[:n]
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "started":   self.started,
+                "elapsed_s": self.elapsed(),
+                "spans":     {k: {"seconds": s, "calls": c} for k, (s, c) in self.spans.items()},
+                "counters":  dict(self.counters),
+                "codes":     {k: dict(v) for k, v in self.codes.items()},
+            }
+
+    def summary_lines(self, n: int = SLOWEST_CODES) -> list:
+        data = self.to_dict()
+        lines = [f"\nTempos da execução (total {data['elapsed_s']:.2f} s):"]
+        spans = data["spans"]
+        names = [k for k in STAGE_LABELS if k in spans] + [k for k in spans if k not in STAGE_LABELS]
+        for name in names:
+            lines.append(f"  {STAGE_LABELS.get(name, name):<36} {spans[name]['seconds']:9.3f} s")
+        if data["counters"]:
+            lines.append("Contadores:")
+            for name, value in data["counters"].items():
+                lines.append(f"  {COUNTER_LABELS.get(name, name):<36} {value:>9}")
+        slowest = self.slowest_codes(n)
+        if slowest:
+            lines.append("Códigos mais lentos:")
+            for code, c in slowest:
+                lines.append(f"  {code:<20} {c['seconds']:9.3f} s  ({c['elements']} elementos,"
+                             f" {c['elements_scanned']} analisados)")
+        return lines
+
+    def write_json(self, path) -> Path:
+        path = Path(path)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2, ensure_ascii=False)
+        return path
@@ -1,8 +1,27 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
 import ifcopenshell
 import ifcopenshell.util.element
+import numpy as np
+
+from app.core.model_cache import file_fingerprint
+from app.core.property_columns import (
+    BoundedMemo,
+    PropertyColumns,
+    predefined_type,
+    predicate_key,
+    prop_predicate,
+)
 
 NO_ELEMENTS_FOUND = "NO_ELEMENTS_FOUND"
 
+PSET_CACHE_SIZE = 200_000
+FILTER_MEMO_SIZE = 4096
+VALUE_INDEX_SIZE = 512
+
 
 def migrate_rule_v1_to_v2(rule: dict) -> dict:
     if "mappings" in rule:
@@ -42,23 +61,369 @@ def load_and_migrate_rules(data: dict) -> dict:
     return rules
 
 
+class RuleCompileError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class FilterPlan:
+    ifc_class: str
+    predefined: str | None = None
+    object_type: str | None = None
+    props: tuple = ()
+
+
+@dataclass(frozen=True)
+class MappingPlan:
+    filter: FilterPlan
+    q_pset: str = ""
+    q_prop: str = ""
+
+
+@dataclass(frozen=True)
+class RulePlan:
+    mappings: tuple
+    qty_type: str = "prop"
+    material: tuple | None = None
+    group_pset: str = ""
+    group_prop: str = ""
+
+
+def _as_dict(value, what: str) -> dict:
+    if value is None:
+        return {}
+    if not isinstance(value, dict):
+        raise RuleCompileError(f"{what}: esperado um objeto, recebido {type(value).__name__}.")
+    return value
+
+
+def compile_filter(filter_spec: dict) -> FilterPlan:
+    spec = _as_dict(filter_spec, "Filtro")
+    predef = spec.get("predefined_type") or spec.get("predefined") or None
+    objtype = spec.get("object_type")
+    extras = spec.get("extra_filters") or spec.get("props") or []
+    if not isinstance(extras, list):
+        raise RuleCompileError("Filtros de propriedades: esperada uma lista.")
+
+    props = []
+    for i, ff in enumerate(extras, start=1):
+        ff = _as_dict(ff, f"Filtro de propriedade {i}")
+        val = ff.get("value")
+        if val is not None and not isinstance(val, (bool, int, float, str)):
+            raise RuleCompileError(
+                f"Filtro de propriedade {i} ({ff.get('pset', '')}.{ff.get('prop', '')}): "
+                f"valor inválido ({type(val).__name__})."
+            )
+        pred = prop_predicate(ff)
+        if pred is not None:
+            props.append(pred)
+
+    return FilterPlan(
+        ifc_class=str(spec.get("ifc_class") or ""),
+        predefined=predef,
+        object_type=str(objtype).upper() if predef == "USERDEFINED" and objtype else None,
+        props=tuple(props),
+    )
+
+
+def compile_mapping(mapping_entry: dict) -> MappingPlan:
+    entry = _as_dict(mapping_entry, "Mapeamento")
+    qd = _as_dict(entry.get("quantity_detail"), "Quantidade")
+    return MappingPlan(
+        filter=compile_filter(entry.get("filter")),
+        q_pset=qd.get("pset", "") or "",
+        q_prop=qd.get("prop", "") or "",
+    )
+
+
+def compile_material(mat_filter) -> tuple | None:
+    if not mat_filter or str(mat_filter).strip() in ("", "None"):
+        return None
+    if isinstance(mat_filter, dict):
+        return (str(mat_filter.get("category", "") or "").strip().lower(),
+                str(mat_filter.get("name", "")     or "").strip().lower())
+    return (str(mat_filter).strip().lower(), "")
+
+
+def compile_rule(rule: dict) -> RulePlan:
+    if isinstance(rule, RulePlan):
+        return rule
+    rule = migrate_rule_v1_to_v2(_as_dict(rule, "Regra"))
+
+    qty_type = _as_dict(rule.get("quantity"), "Quantidade").get("type") or "prop"
+    if qty_type not in ("prop", "count"):
+        raise RuleCompileError(f"Tipo de quantificação inválido: '{qty_type}'.")
+
+    mappings = rule.get("mappings") or []
+    if not isinstance(mappings, list):
+        raise RuleCompileError("Mapeamentos: esperada uma lista.")
+    compiled = []
+    for i, m in enumerate(mappings, start=1):
+        try:
+            compiled.append(compile_mapping(m))
+        except RuleCompileError as e:
+            raise RuleCompileError(f"Mapeamento {i}: {e}") from None
+
+    agr = _as_dict(rule.get("agrupamento"), "Agrupamento")
+    return RulePlan(
+        mappings=tuple(compiled),
+        qty_type=qty_type,
+        material=compile_material(rule.get("material")),
+        group_pset=agr.get("pset", "") or "",
+        group_prop=agr.get("prop", "") or "",
+    )
+
+
+def compile_rules(rules: dict) -> tuple[dict, dict]:
+    plans, errors = {}, {}
+    for code, rule in rules.items():
+        try:
+            plans[code] = compile_rule(rule)
+        except RuleCompileError as e:
+            errors[code] = str(e)
+    return plans, errors
+
+
+def rule_key(rule) -> str:
+    # Plans are normalized frozen dataclasses of plain values, so their repr
+    # is a canonical form of the rule.
+    text = repr(compile_rule(rule))
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+_MATERIAL_CHILDREN = {
+    "IfcMaterialLayerSet":        ("MaterialLayers",),
+    "IfcMaterialLayerSetUsage":   ("ForLayerSet",),
+    "IfcMaterialConstituentSet":  ("MaterialConstituents",),
+    "IfcMaterialProfileSet":      ("MaterialProfiles",),
+    "IfcMaterialProfileSetUsage": ("ForProfileSet",),
+    "IfcMaterialList":            ("Materials",),
+}
+
+
+def material_pairs(definition, memo=None) -> tuple:
+    if definition is None:
+        return ()
+    try:
+        key = definition.id()
+    except Exception:
+        key = None
+    if memo is not None and key in memo:
+        return memo[key]
+
+    try:
+        kind = definition.is_a()
+    except Exception:
+        kind = ""
+    pairs = []
+    if kind == "IfcMaterial":
+        pairs.append((
+            (getattr(definition, "Name",     "") or "").strip(),
+            (getattr(definition, "Category", "") or "").strip(),
+        ))
+    elif kind in _MATERIAL_CHILDREN:
+        for attr in _MATERIAL_CHILDREN[kind]:
+            children = getattr(definition, attr, None)
+            if children is None:
+                continue
+            if not isinstance(children, (list, tuple)):
+                children = [children]
+            for child in children:
+                pairs.extend(material_pairs(child, memo))
+    else:
+        pairs.extend(material_pairs(getattr(definition, "Material", None), memo))
+
+    result = tuple(dict.fromkeys(pairs))
+    if memo is not None and key is not None:
+        memo[key] = result
+    return result
+
+
+def _classification_system(ref) -> str:
+    seen = set()
+    cur = getattr(ref, "ReferencedSource", None)
+    while cur is not None and cur.id() not in seen:
+        seen.add(cur.id())
+        if cur.is_a("IfcClassification"):
+            return str(getattr(cur, "Name", None) or "")
+        cur = getattr(cur, "ReferencedSource", None)
+    return ""
+
+
 class IFCInvestigator:
-    def __init__(self):
+    def __init__(self, pset_cache_size: int = PSET_CACHE_SIZE, index_cache=None):
         self.ifc_file = None
         self.index_by_class = {}
         self.predefs_by_class = {}
-
-    def open_ifc(self, path: str):
+        self.property_columns = None
+        self.index_cache = index_cache
+        self.index_from_cache = False
+        self._fingerprint = None
+        self._materials_catalog = None
+        self._storey_by_id = None
+        self._materials_by_id = None
+        self._ids_by_material_category = {}
+        self._ids_by_material_name = {}
+        self._material_label_by_id = {}
+        self._material_index_file = None
+        self._class_by_obj = None
+        self._classification_index_file = None
+        self._filter_memo_owner = None
+        self._reset_filter_memo()
+
+        self._pset_cache = OrderedDict()
+        self._pset_cache_size = pset_cache_size
+        self._pset_lock = threading.Lock()
+        self.pset_cache_hits = 0
+        self.pset_cache_misses = 0
+        self.elements_scanned = 0
+
+    def open_ifc(self, path: str, indexed: bool = False):
         self.ifc_file = ifcopenshell.open(path)
         self.index_by_class.clear()
         self.predefs_by_class.clear()
+        self.property_columns = None
+        self._materials_catalog = None
+        self._storey_by_id = None
+        self._materials_by_id = None
+        self._ids_by_material_category = {}
+        self._ids_by_material_name = {}
+        self._material_label_by_id = {}
+        self.index_from_cache = False
+        self._fingerprint = None
+        self._class_by_obj = None
+        self._filter_memo_owner = None
+        self._reset_filter_memo()
+        self.clear_pset_cache()
+        self.elements_scanned = 0
+
+        snapshot = None
+        if self.index_cache is not None:
+            try:
+                self._fingerprint = file_fingerprint(path)
+                snapshot = self.index_cache.load(self._fingerprint)
+            except OSError:
+                self._fingerprint = None
+
+        if snapshot is not None:
+            self._restore_snapshot(snapshot)
+        else:
+            for e in self.ifc_file.by_type("IfcProduct"):
+                etype = e.is_a()
+                self.index_by_class.setdefault(etype, []).append(e)
+                self.predefs_by_class.setdefault(etype, set()).add(predefined_type(e))
+
+        if self._storey_by_id is None:
+            self._build_storey_index()
+        self._ensure_material_index()
+        self._ensure_classification_index()
+
+        if indexed:
+            self.build_property_columns()
+        elif snapshot is None:
+            self._save_snapshot()
+
+    def build_property_columns(self):
+        if self.property_columns is None:
+            self.set_property_columns(PropertyColumns.build(self.index_by_class))
+        return self.property_columns
+
+    def set_property_columns(self, columns: PropertyColumns):
+        self.property_columns = columns
+        self._save_snapshot()
+
+    def _restore_snapshot(self, snapshot: dict):
+        by_id = self.ifc_file.by_id
+        for etype, ids in snapshot["classes"].items():
+            self.index_by_class[etype] = [by_id(i) for i in ids]
+        for etype, predefs in snapshot["predefs"].items():
+            self.predefs_by_class[etype] = set(predefs)
+        self._class_by_obj = dict(snapshot["classification"])
+        self._classification_index_file = self.ifc_file
+        self._materials_catalog = dict(snapshot["materials"])
+        self._storey_by_id = dict(snapshot["storeys"])
+        self._set_material_index(snapshot["material_pairs"])
+        if snapshot.get("columns") is not None:
+            self.property_columns = PropertyColumns.from_snapshot(snapshot["columns"])
+        self.index_from_cache = True
+
+    def _save_snapshot(self):
+        if self.index_cache is None or self._fingerprint is None:
+            return
+        self._ensure_classification_index()
+        snapshot = {
+            "classes":        {t: [e.id() for e in els] for t, els in self.index_by_class.items()},
+            "predefs":        {t: sorted(p) for t, p in self.predefs_by_class.items()},
+            "classification": self._class_by_obj,
+            "materials":      self.extract_all_materials(),
+            "storeys":        self._storey_by_id or {},
+            "material_pairs": self._materials_by_id or {},
+            "columns":        self.property_columns.snapshot() if self.property_columns else None,
+        }
+        self.index_cache.save(self._fingerprint, snapshot)
+
+    def get_psets(self, element) -> dict:
+        # Every pset lookup of a run (filtering, quantities, grouping, report
+        # details) goes through here so each element is resolved only once.
+        try:
+            key = element.id()
+        except Exception:
+            return ifcopenshell.util.element.get_psets(element) or {}
+
+        with self._pset_lock:
+            psets = self._pset_cache.get(key)
+            if psets is not None:
+                self._pset_cache.move_to_end(key)
+                self.pset_cache_hits += 1
+                return psets
+
+        psets = ifcopenshell.util.element.get_psets(element) or {}
+
+        with self._pset_lock:
+            self.pset_cache_misses += 1
+            self._pset_cache[key] = psets
+            while len(self._pset_cache) > self._pset_cache_size:
+                self._pset_cache.popitem(last=False)
+        return psets
+
+    def clear_pset_cache(self):
+        with self._pset_lock:
+            self._pset_cache.clear()
+            self.pset_cache_hits = 0
+            self.pset_cache_misses = 0
+
+    def pset_cache_stats(self) -> dict:
+        with self._pset_lock:
+            return {
+                "hits":     self.pset_cache_hits,
+                "misses":   self.pset_cache_misses,
+                "size":     len(self._pset_cache),
+                "max_size": self._pset_cache_size,
+            }
+
+    def _reset_filter_memo(self):
+        self._prefix_memo = BoundedMemo(FILTER_MEMO_SIZE)
+        self._filter_memo = BoundedMemo(FILTER_MEMO_SIZE)
+        self._value_index = BoundedMemo(VALUE_INDEX_SIZE)
+        self.filter_memo_hits = 0
+
+    def filter_memo_stats(self) -> dict:
+        return {
+            "prefixes":     len(self._prefix_memo),
+            "filters":      len(self._filter_memo),
+            "value_index":  len(self._value_index),
+            "hits":         self.filter_memo_hits,
+        }
 
-        for e in self.ifc_file.by_type("IfcProduct"):
-            etype = e.is_a()
-            self.index_by_class.setdefault(etype, []).append(e)
-            predef = getattr(e, "PredefinedType", None)
-            if predef:
-                self.predefs_by_class.setdefault(etype, set()).add(str(predef))
+    def engine_counters(self) -> dict:
+        with self._pset_lock:
+            hits, misses = self.pset_cache_hits, self.pset_cache_misses
+        return {
+            "elements_scanned": self.elements_scanned,
+            "pset_calls":       hits + misses,
+            "pset_cache_hits":  hits,
+            "filter_memo_hits": self.filter_memo_hits,
+        }
 
     def list_classes(self):
         return sorted(self.index_by_class.keys())
@@ -67,163 +432,209 @@ class IFCInvestigator:
         return sorted(self.predefs_by_class.get(ifc_class, []))
 
     def _filter_single(self, filter_spec: dict) -> list:
+        plan = filter_spec if isinstance(filter_spec, FilterPlan) else compile_filter(filter_spec)
+        return self._filter_plan(plan)
+
+    def _filter_plan(self, plan: FilterPlan) -> list:
         if not self.ifc_file:
             raise RuntimeError("No IFC file loaded.")
-
-        etype = filter_spec.get("ifc_class")
-        if not etype:
+        if not plan.ifc_class:
             return []
 
-        elems = self.index_by_class.get(etype, [])
+        # Rules generated from a WBS often share (class, predefined, object
+        # type) and differ only in a property or the material: the candidate
+        # set of each prefix and the result of each distinct filter are
+        # computed once per model and reused across WBS codes.
+        owner = (self.ifc_file, self.property_columns)
+        if self._filter_memo_owner is None or any(
+                a is not b for a, b in zip(self._filter_memo_owner, owner)):
+            self._reset_filter_memo()
+            self._filter_memo_owner = owner
+
+        elems = self._filter_memo.get(plan)
+        if elems is None:
+            elems = self._filter_memo[plan] = self._evaluate_filter(plan)
+        else:
+            self.filter_memo_hits += 1
+        return list(elems)
+
+    def _filter_prefix(self, plan: FilterPlan):
+        key = (plan.ifc_class, plan.predefined, plan.object_type)
+        base = self._prefix_memo.get(key)
+        if base is not None:
+            return base
+
+        etype = plan.ifc_class
+        cols = self.property_columns
+        if cols is not None and etype in cols:
+            base = cols.attr_mask(etype, plan.predefined, plan.object_type)
+        else:
+            pos = range(len(self.index_by_class.get(etype, [])))
+            elems = self.index_by_class.get(etype, [])
+            if plan.predefined:
+                pos = [i for i in pos if predefined_type(elems[i]) == plan.predefined]
+            if plan.object_type:
+                pos = [i for i in pos
+                       if str(getattr(elems[i], "ObjectType", "")).upper() == plan.object_type]
+            base = frozenset(pos)
+        self._prefix_memo[key] = base
+        return base
+
+    def value_index(self, etype: str, pset: str, prop: str, kind: str = "text") -> dict:
+        # Inverted index for equality filters: normalized value -> positions
+        # in index_by_class[etype]. Built on first use of (pset, prop) and
+        # kept until the model changes, unless no element has the property.
+        key = (etype, pset, prop, kind)
+        index = self._value_index.get(key)
+        if index is not None:
+            return index
 
-        predef = filter_spec.get("predefined_type") or filter_spec.get("predefined")
-        if predef:
-            elems = [e for e in elems if str(getattr(e, "PredefinedType", "")) == predef]
-
-        objtype = filter_spec.get("object_type")
-        if predef == "USERDEFINED" and objtype:
-            elems = [e for e in elems
-                     if str(getattr(e, "ObjectType", "")).upper() == objtype.upper()]
-
-        extras = filter_spec.get("extra_filters") or filter_spec.get("props", [])
-        if extras:
-            def _bool_from_ifc(v) -> bool | None:
-                if isinstance(v, bool):
-                    return v
-                if v is None:
-                    return None
-                s = str(v).strip().upper()
-                if s in ("TRUE", ".T.", "T", "1", "YES"):
-                    return True
-                if s in ("FALSE", ".F.", "F", "0", "NO"):
-                    return False
-                return None
+        elems = self.index_by_class.get(etype, [])
+        cols = self.property_columns
+        if cols is not None and etype in cols:
+            values = cols.raw(etype, pset, prop)
+            exists = cols.has(etype, pset, prop)
+        else:
+            values = [self.get_psets(e).get(pset, {}).get(prop) for e in elems]
+            exists = any(v is not None for v in values)
+
+        groups = {}
+        for pos, v in enumerate(values):
+            k = predicate_key(kind, v)
+            if k is not None:
+                groups.setdefault(k, []).append(pos)
+        index = {k: frozenset(p) for k, p in groups.items()}
+        if exists:
+            self._value_index[key] = index
+        return index
+
+    def _evaluate_filter(self, plan: FilterPlan) -> tuple:
+        etype = plan.ifc_class
+        elems = self.index_by_class.get(etype, [])
+        base = self._filter_prefix(plan)
+        self.elements_scanned += len(elems)
 
-            def _match_props(e):
-                psets = ifcopenshell.util.element.get_psets(e)
-                try:
-                    type_psets = ifcopenshell.util.element.get_psets(e, psets_only=False)
-                    merged = {**type_psets, **psets}
-                except Exception:
-                    merged = psets
+        cols = self.property_columns
+        if cols is not None and etype in cols:
+            mask = cols.mask(etype, extras=plan.props, base=base)
+            return tuple(elems[i] for i in np.flatnonzero(mask))
 
-                for ff in extras:
-                    pset = ff.get("pset", "")
-                    prop = ff.get("prop", "")
-                    val  = ff.get("value")
-                    if not pset or not prop or val is None:
-                        continue
-                    cur_val = merged.get(pset, {}).get(prop)
-                    if isinstance(val, bool):
-                        cur_bool = _bool_from_ifc(cur_val)
-                        if cur_bool is None or cur_bool != val:
-                            return False
-                    elif isinstance(val, (int, float)):
-                        try:
-                            if float(cur_val) != float(val):
-                                return False
-                        except (ValueError, TypeError):
-                            return False
-                    else:
-                        val_s = str(val).strip().lower()
-                        cur_s = str(cur_val).strip().lower()
-                        bool_map = {
-                            ".t.": "true", "t": "true", "1": "true", "yes": "true",
-                            ".f.": "false", "f": "false", "0": "false", "no": "false",
-                        }
-                        val_s = bool_map.get(val_s, val_s)
-                        cur_s = bool_map.get(cur_s, cur_s)
-                        if val_s != cur_s:
-                            return False
-                return True
-
-            elems = [e for e in elems if _match_props(e)]
-
-        return elems
+        hits = base
+        for kind, pset, prop, want in plan.props:
+            hits = hits & self.value_index(etype, pset, prop, kind).get(want, frozenset())
+            if not hits:
+                return ()
+        return tuple(elems[i] for i in sorted(hits))
 
     def _apply_material_filter(self, elems: list, mat_filter) -> list:
-        if not mat_filter or str(mat_filter).strip() in ("", "None"):
+        if not isinstance(mat_filter, tuple):
+            mat_filter = compile_material(mat_filter)
+        if mat_filter is None:
             return elems
+        wanted_cat, wanted_name = mat_filter
+
+        self._ensure_material_index()
+        wanted = set()
+        if wanted_cat:
+            wanted |= self._ids_by_material_category.get(wanted_cat, set())
+        if wanted_name:
+            wanted |= self._ids_by_material_name.get(wanted_name, set())
+        if not wanted:
+            return []
 
-        if isinstance(mat_filter, dict):
-            wanted_cat  = str(mat_filter.get("category", "") or "").strip().lower()
-            wanted_name = str(mat_filter.get("name", "")     or "").strip().lower()
-        else:
-            wanted_cat  = str(mat_filter or "").strip().lower()
-            wanted_name = ""
+        def _id(el):
+            try:
+                return el.id()
+            except Exception:
+                return None
 
-        def _materials_of(el):
-            mats = []
+        return [e for e in elems if _id(e) in wanted]
 
-            def _add(m):
-                if not m:
-                    return
+    def _build_material_index(self):
+        # Direct associations win; otherwise the element inherits the
+        # material of its type (IfcRelDefinesByType).
+        by_id = {}
+        if self.ifc_file:
+            memo = {}
+
+            def _rels(ifc_class):
                 try:
-                    kind = m.is_a()
+                    return self.ifc_file.by_type(ifc_class) or []
                 except Exception:
-                    kind = ""
-                if kind == "IfcMaterial":
-                    mats.append({
-                        "name":     (getattr(m, "Name",     "") or "").strip(),
-                        "category": (getattr(m, "Category", "") or "").strip(),
-                    })
-                elif kind == "IfcMaterialLayer":
-                    _add(getattr(m, "Material", None))
-                elif kind == "IfcMaterialLayerSet":
-                    for lyr in (getattr(m, "MaterialLayers", None) or []):
-                        _add(getattr(lyr, "Material", None))
-                elif kind == "IfcMaterialConstituent":
-                    _add(getattr(m, "Material", None))
-                elif kind == "IfcMaterialConstituentSet":
-                    for c in (getattr(m, "MaterialConstituents", None) or []):
-                        _add(getattr(c, "Material", None))
-                else:
-                    maybe = getattr(m, "Material", None)
-                    if maybe:
-                        _add(maybe)
-
-            try:
-                for rel in (getattr(el, "HasAssociations", None) or []):
-                    if rel and getattr(rel, "is_a", lambda: "")() == "IfcRelAssociatesMaterial":
-                        _add(getattr(rel, "RelatingMaterial", None))
-            except Exception:
-                pass
-            return mats
-
-        def _match(el):
-            for d in _materials_of(el):
-                nm  = (d.get("name",     "") or "").strip().lower()
-                cat = (d.get("category", "") or "").strip().lower()
-                if wanted_cat  and cat == wanted_cat:
-                    return True
-                if wanted_name and nm  == wanted_name:
-                    return True
-            return False
+                    return []
+
+            for rel in _rels("IfcRelAssociatesMaterial"):
+                pairs = material_pairs(getattr(rel, "RelatingMaterial", None), memo)
+                for obj in getattr(rel, "RelatedObjects", None) or []:
+                    try:
+                        oid = obj.id()
+                    except Exception:
+                        continue
+                    by_id[oid] = tuple(dict.fromkeys(by_id.get(oid, ()) + pairs))
 
-        return [e for e in elems if _match(e)]
+            for rel in _rels("IfcRelDefinesByType"):
+                type_pairs = by_id.get(getattr(getattr(rel, "RelatingType", None), "id", lambda: None)())
+                if not type_pairs:
+                    continue
+                for obj in getattr(rel, "RelatedObjects", None) or []:
+                    try:
+                        oid = obj.id()
+                    except Exception:
+                        continue
+                    if not by_id.get(oid):
+                        by_id[oid] = type_pairs
+        self._set_material_index(by_id)
+
+    def _set_material_index(self, by_id: dict):
+        self._materials_by_id = by_id
+        self._material_index_file = self.ifc_file
+        self._ids_by_material_category = {}
+        self._ids_by_material_name = {}
+        for oid, pairs in by_id.items():
+            for name, cat in pairs:
+                if cat:
+                    self._ids_by_material_category.setdefault(cat.lower(), set()).add(oid)
+                if name:
+                    self._ids_by_material_name.setdefault(name.lower(), set()).add(oid)
+
+    def _ensure_material_index(self):
+        if self._materials_by_id is None or self._material_index_file is not self.ifc_file:
+            self._materials_catalog = None
+            self._material_label_by_id = {}
+            self._build_material_index()
+
+    def get_material_pairs(self, element) -> tuple:
+        self._ensure_material_index()
+        try:
+            return self._materials_by_id.get(element.id(), ())
+        except Exception:
+            return ()
 
     def filter_elements_for_mapping(self, mapping_entry: dict) -> list:
-        elems = self._filter_single(mapping_entry.get("filter", {}))
-        if not elems:
-            return []
-        return elems
+        if not isinstance(mapping_entry, MappingPlan):
+            mapping_entry = compile_mapping(mapping_entry)
+        return self._filter_plan(mapping_entry.filter)
 
     def filter_elements(self, rule: dict) -> list:
-        rule = migrate_rule_v1_to_v2(rule)
+        plan = compile_rule(rule)
         all_elems = []
-        for m in rule.get("mappings", []):
+        for m in plan.mappings:
             all_elems.extend(self.filter_elements_for_mapping(m))
-        mat = rule.get("material")
-        if mat:
-            all_elems = self._apply_material_filter(all_elems, mat)
+        if plan.material is not None:
+            all_elems = self._apply_material_filter(all_elems, plan.material)
         return all_elems
 
     def sum_quantity(self, elements, q_pset: str, q_prop: str):
+        if self.property_columns is not None:
+            located = self._sum_quantity_columns(elements, q_pset, q_prop)
+            if located is not None:
+                return located
+
         total = 0.0
         details = []
         for e in elements:
             try:
-                psets = ifcopenshell.util.element.get_psets(e)
+                psets = self.get_psets(e)
                 if not psets:
                     continue
                 val = psets.get(q_pset, {}).get(q_prop)
@@ -239,6 +650,25 @@ class IFCInvestigator:
                 pass
         return total, details
 
+    def _sum_quantity_columns(self, elements, q_pset: str, q_prop: str):
+        cols = self.property_columns
+        locs = [cols.locate(e) for e in elements]
+        if any(loc is None for loc in locs):
+            return None
+
+        nums = np.empty(len(locs), dtype=np.float64)
+        for etype in {loc[0] for loc in locs}:
+            idx = [i for i, loc in enumerate(locs) if loc[0] == etype]
+            pos = [locs[i][1] for i in idx]
+            nums[idx] = cols.quantities(etype, q_pset, q_prop)[pos]
+
+        details = [
+            {"element": elements[i], "guid": elements[i].GlobalId, "valor": float(nums[i])}
+            for i in np.flatnonzero(~np.isnan(nums))
+        ]
+        total = sum(d["valor"] for d in details)
+        return total, details
+
     def count_elements(self, elements: list):
         count = len(elements)
         details = [
@@ -248,30 +678,25 @@ class IFCInvestigator:
         return count, details
 
     def extract_quantities(self, rule: dict):
-        rule = migrate_rule_v1_to_v2(rule)
-        qty_type = rule.get("quantity", {}).get("type", "prop")
-        mat = rule.get("material")
+        plan = compile_rule(rule)
+        qty_type = plan.qty_type
 
         all_details = []
 
-        for mapping_entry in rule.get("mappings", []):
-            elems = self.filter_elements_for_mapping(mapping_entry)
-            if mat:
-                elems = self._apply_material_filter(elems, mat)
+        for mapping in plan.mappings:
+            if qty_type != "count" and (not mapping.q_pset or not mapping.q_prop):
+                continue
+            elems = self.filter_elements_for_mapping(mapping)
+            if plan.material is not None:
+                elems = self._apply_material_filter(elems, plan.material)
             if not elems:
                 continue
 
             if qty_type == "count":
                 _, dets = self.count_elements(elems)
-                all_details.extend(dets)
             else:
-                qty_detail = mapping_entry.get("quantity_detail", {})
-                q_pset = qty_detail.get("pset", "")
-                q_prop = qty_detail.get("prop", "")
-                if not q_pset or not q_prop:
-                    continue
-                _, dets = self.sum_quantity(elems, q_pset, q_prop)
-                all_details.extend(dets)
+                _, dets = self.sum_quantity(elems, mapping.q_pset, mapping.q_prop)
+            all_details.extend(dets)
 
         found_any = bool(all_details)
         total = sum(d.get("valor", 0.0) for d in all_details)
@@ -281,12 +706,38 @@ class IFCInvestigator:
 
         return total, all_details, found_any
 
+    def preview_rule(self, rule: dict, cancelled=None):
+        plan = compile_rule(rule)
+        counting = plan.qty_type == "count"
+
+        blocks = []
+        for mapping in plan.mappings:
+            if cancelled is not None and cancelled():
+                return None
+            elems = self.filter_elements_for_mapping(mapping)
+            if plan.material is not None:
+                elems = self._apply_material_filter(elems, plan.material)
+            if counting:
+                total = len(elems)
+            elif mapping.q_pset and mapping.q_prop:
+                total, _ = self.sum_quantity(elems, mapping.q_pset, mapping.q_prop)
+            else:
+                total = None
+            blocks.append({"count": len(elems), "total": total})
+
+        totals = [b["total"] for b in blocks if b["total"] is not None]
+        return {
+            "blocks": blocks,
+            "count":  sum(b["count"] for b in blocks),
+            "total":  sum(totals) if totals else None,
+        }
+
     def get_prop_values(self, elements, pset: str, prop: str):
         out = []
         seen = set()
         for e in elements or []:
             try:
-                psets = ifcopenshell.util.element.get_psets(e)
+                psets = self.get_psets(e)
                 if not psets:
                     continue
                 val = psets.get(pset, {}).get(prop)
@@ -301,6 +752,17 @@ class IFCInvestigator:
         return out
 
     def get_element_material(self, element):
+        self._ensure_material_index()
+        try:
+            key = element.id()
+        except Exception:
+            return self._material_label(element)
+        label = self._material_label_by_id.get(key)
+        if label is None:
+            label = self._material_label_by_id[key] = self._material_label(element)
+        return label
+
+    def _material_label(self, element):
         try:
             rels = getattr(element, "HasAssociations", [])
             for rel in rels:
@@ -318,39 +780,20 @@ class IFCInvestigator:
     def extract_all_materials(self):
         if not self.ifc_file:
             return {}
+        self._ensure_material_index()
+        if self._materials_catalog is not None:
+            return dict(self._materials_catalog)
         materials = {}
         try:
             products = self.ifc_file.by_type("IfcProduct")
         except Exception:
             products = []
-
         for element in products:
-            try:
-                rels = getattr(element, "HasAssociations", [])
-                for rel in rels:
-                    if rel.is_a("IfcRelAssociatesMaterial"):
-                        mat = rel.RelatingMaterial
-                        if mat.is_a("IfcMaterialLayerSet") and hasattr(mat, "MaterialLayers"):
-                            for layer in mat.MaterialLayers:
-                                if layer.Material:
-                                    m_name = str(layer.Material.Name) if hasattr(layer.Material, "Name") else "n/a"
-                                    m_cat  = str(layer.Material.Category) if hasattr(layer.Material, "Category") else "n/a"
-                                    if m_cat and m_cat != "n/a" and m_cat not in materials:
-                                        materials[m_cat] = m_name
-                        elif mat.is_a("IfcMaterial"):
-                            m_name = str(mat.Name) if hasattr(mat, "Name") else "n/a"
-                            m_cat  = str(mat.Category) if hasattr(mat, "Category") else "n/a"
-                            if m_cat and m_cat != "n/a" and m_cat not in materials:
-                                materials[m_cat] = m_name
-                        elif mat.is_a("IfcMaterialList") and hasattr(mat, "Materials"):
-                            for m in mat.Materials:
-                                m_name = str(m.Name) if hasattr(m, "Name") else "n/a"
-                                m_cat  = str(m.Category) if hasattr(m, "Category") else "n/a"
-                                if m_cat and m_cat != "n/a" and m_cat not in materials:
-                                    materials[m_cat] = m_name
-            except Exception:
-                pass
-        return materials
+            for m_name, m_cat in self.get_material_pairs(element):
+                if m_cat and m_cat != "n/a" and m_cat not in materials:
+                    materials[m_cat] = m_name or "n/a"
+        self._materials_catalog = materials
+        return dict(materials)
 
     def get_project_info(self):
         if not self.ifc_file:
@@ -368,6 +811,7 @@ class IFCInvestigator:
 
     def _build_classification_index(self):
         self._class_by_obj = {}
+        self._classification_index_file = self.ifc_file
         if not self.ifc_file:
             return
         try:
@@ -377,32 +821,148 @@ class IFCInvestigator:
         for rel in rels or []:
             ref = getattr(rel, "RelatingClassification", None)
             code = None
+            system = ""
             if ref is not None:
                 if ref.is_a("IfcClassificationReference"):
                     code = (getattr(ref, "Identification", None) or
                             getattr(ref, "ItemReference", None) or
                             getattr(ref, "Name", None))
+                    system = _classification_system(ref)
                 elif ref.is_a("IfcClassification"):
                     code = (getattr(ref, "Identification", None) or
                             getattr(ref, "Name", None))
+                    system = str(getattr(ref, "Name", None) or "")
             if not code:
                 code = "n/a"
             for obj in getattr(rel, "RelatedObjects", []) or []:
                 try:
-                    self._class_by_obj[obj.id()] = str(code)
+                    entries = self._class_by_obj.setdefault(obj.id(), [])
                 except Exception:
-                    pass
+                    continue
+                if (system, str(code)) not in entries:
+                    entries.append((system, str(code)))
+
+    def _ensure_classification_index(self):
+        if self._class_by_obj is None or self._classification_index_file is not self.ifc_file:
+            self._build_classification_index()
 
-    def get_classification_code(self, element):
+    def get_classifications(self, element) -> list:
         if element is None:
+            return []
+        self._ensure_classification_index()
+        try:
+            return list(self._class_by_obj.get(element.id(), ()))
+        except Exception:
+            return []
+
+    def get_classification_code(self, element, system: str | None = None):
+        entries = self.get_classifications(element)
+        if system is not None:
+            entries = [e for e in entries if e[0] == system]
+        codes = [code for _, code in entries if code != "n/a"]
+        if not codes:
             return "n/a"
-        if not hasattr(self, "_class_by_obj"):
-            self._build_classification_index()
-        return self._class_by_obj.get(element.id(), "n/a")
+        return ", ".join(dict.fromkeys(codes))
+
+    def _build_storey_index(self):
+        # Same resolution as get_container + Decomposes climb, done once for
+        # every product: direct containment first, otherwise the container of
+        # the aggregate / nest / filled opening / voided element parent.
+        self._storey_by_id = {}
+        if not self.ifc_file:
+            return
+
+        contained = {}
+        parent_by_kind = ({}, {}, {}, {}, {})
+        rel_specs = (
+            ("IfcRelAggregates",      "RelatingObject",          "RelatedObjects"),
+            ("IfcRelNests",           "RelatingObject",          "RelatedObjects"),
+            ("IfcRelFillsElement",    "RelatingOpeningElement",  "RelatedBuildingElement"),
+            ("IfcRelVoidsElement",    "RelatingBuildingElement", "RelatedOpeningElement"),
+            ("IfcRelAdheresToElement", "RelatingElement",        "RelatedSurfaceFeatures"),
+        )
+
+        def _rels(ifc_class):
+            try:
+                return self.ifc_file.by_type(ifc_class) or []
+            except Exception:
+                return []
+
+        for rel in _rels("IfcRelContainedInSpatialStructure"):
+            structure = getattr(rel, "RelatingStructure", None)
+            for obj in getattr(rel, "RelatedElements", None) or []:
+                contained.setdefault(obj.id(), structure)
+        for parents, (ifc_class, relating, related) in zip(parent_by_kind, rel_specs):
+            for rel in _rels(ifc_class):
+                parent = getattr(rel, relating, None)
+                children = getattr(rel, related, None)
+                if children is None:
+                    continue
+                if not isinstance(children, (list, tuple)):
+                    children = [children]
+                for obj in children:
+                    parents.setdefault(obj.id(), parent)
+        aggregate_of = parent_by_kind[0]
+        if getattr(self.ifc_file, "schema", "") == "IFC2X3":
+            for oid, parent in parent_by_kind[1].items():
+                aggregate_of.setdefault(oid, parent)
+
+        storey_of_container = {}
+
+        def _storey_from(container):
+            cid = container.id()
+            if cid in storey_of_container:
+                return storey_of_container[cid]
+            name = "n/a"
+            visited = set()
+            cur = container
+            while cur is not None and cur.id() not in visited:
+                visited.add(cur.id())
+                if cur.is_a("IfcBuildingStorey"):
+                    name = getattr(cur, "Name", None) or getattr(cur, "LongName", None) or "n/a"
+                    break
+                cur = aggregate_of.get(cur.id())
+            storey_of_container[cid] = name
+            return name
+
+        container_memo = {}
+
+        def _container_of(element):
+            chain = []
+            cur = element
+            container = None
+            while cur is not None:
+                oid = cur.id()
+                if oid in container_memo:
+                    container = container_memo[oid]
+                    break
+                if oid in chain:
+                    break
+                chain.append(oid)
+                container = contained.get(oid)
+                if container is not None:
+                    break
+                cur = next((p[oid] for p in parent_by_kind if oid in p), None)
+            for oid in chain:
+                container_memo[oid] = container
+            return container
+
+        for elems in self.index_by_class.values():
+            for e in elems:
+                container = _container_of(e)
+                self._storey_by_id[e.id()] = _storey_from(container) if container is not None else "n/a"
 
     def get_building_storey(self, element):
         if not element or not self.ifc_file:
             return "n/a"
+        if self._storey_by_id is not None:
+            try:
+                return self._storey_by_id[element.id()]
+            except (KeyError, AttributeError):
+                pass
+        return self._walk_building_storey(element)
+
+    def _walk_building_storey(self, element):
         try:
             import ifcopenshell.util.element as util_element
         except Exception:
@@ -0,0 +1,69 @@
+import math
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+
+HEADER_FILL  = PatternFill(start_color="00B050", end_color="00B050", fill_type="solid")
+HEADER_FONT  = Font(bold=True, color="FFFFFF", size=12)
+HEADER_ALIGN = Alignment(horizontal="center", vertical="center", wrap_text=True)
+GRAY_FILL    = PatternFill(start_color="F2F2F2", end_color="F2F2F2", fill_type="solid")
+WHITE_FILL   = PatternFill(start_color="FFFFFF", end_color="FFFFFF", fill_type="solid")
+WARN_FILL    = PatternFill(start_color="FFF3CD", end_color="FFF3CD", fill_type="solid")
+BORDER       = Border(
+    left=Side(style="thin"), right=Side(style="thin"),
+    top=Side(style="thin"),  bottom=Side(style="thin"),
+)
+DATA_ALIGN   = Alignment(horizontal="left", vertical="top", wrap_text=True)
+
+COLUMN_WIDTHS = {"A": 20, "B": 50, "C": 15, "D": 12}
+
+
+def _plain(value):
+    if value is None:
+        return None
+    if hasattr(value, "item"):
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+def _row_fill(kind, warn):
+    if warn:
+        return WARN_FILL
+    return GRAY_FILL if kind == "wbs" else WHITE_FILL
+
+
+def write_report_sheet(path, df, row_kinds, warn_rows=None, sheet_name="WBS Preenchido"):
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(sheet_name)
+    for letter, width in COLUMN_WIDTHS.items():
+        ws.column_dimensions[letter].width = width
+
+    header = []
+    for name in df.columns:
+        cell = WriteOnlyCell(ws, value=_plain(name))
+        if cell.value:
+            cell.fill = HEADER_FILL
+            cell.font = HEADER_FONT
+            cell.alignment = HEADER_ALIGN
+            cell.border = BORDER
+        header.append(cell)
+    ws.append(header)
+
+    if warn_rows is None:
+        warn_rows = [False] * len(row_kinds)
+    for values, kind, warn in zip(df.itertuples(index=False, name=None), row_kinds, warn_rows):
+        fill = _row_fill(kind, warn)
+        row = []
+        for value in values:
+            cell = WriteOnlyCell(ws, value=_plain(value))
+            cell.fill = fill
+            cell.border = BORDER
+            cell.alignment = DATA_ALIGN
+            row.append(cell)
+        ws.append(row)
+
+    wb.save(path)
+    return path
@@ -0,0 +1,57 @@
+import queue
+
+LOG_POLL_MS = 100
+DRAIN_MAX = 5000
+
+
+class LogChannel:
+    # Hand-off from the report worker thread to the Tk thread. The worker only
+    # puts messages, progress events and callbacks on a queue; the Tk thread
+    # drains it in batches from after(), so widgets are only touched there.
+
+    def __init__(self):
+        self._queue = queue.SimpleQueue()
+
+    def log(self, msg: str):
+        self._queue.put(("log", msg))
+
+    def progress(self, event: dict):
+        self._queue.put(("progress", event))
+
+    def call(self, fn, *args):
+        self._queue.put(("call", (fn, args)))
+
+    def close(self):
+        self._queue.put(("close", None))
+
+    def drain(self, max_items: int = DRAIN_MAX) -> dict:
+        lines, calls = [], []
+        progress, closed = None, False
+        for _ in range(max_items):
+            try:
+                kind, payload = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "log":
+                lines.append(payload if payload.endswith("\n") else payload + "\n")
+            elif kind == "progress":
+                progress = payload
+            elif kind == "call":
+                calls.append(payload)
+            else:
+                closed = True
+        return {"text": "".join(lines), "progress": progress, "calls": calls, "closed": closed}
+
+
+def format_eta(seconds) -> str:
+    if seconds is None:
+        return "--:--"
+    seconds = int(round(seconds))
+    h, rem = divmod(seconds, 3600)
+    m, s = divmod(rem, 60)
+    return f"{h}:{m:02d}:{s:02d}" if h else f"{m:02d}:{s:02d}"
+
+
+def format_progress(event: dict) -> str:
+    return (f"{event['done']} / {event['total']} códigos · "
+            f"{event['elements']} elementos · ETA {format_eta(event.get('eta_s'))}")
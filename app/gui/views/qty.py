@@ -1,4 +1,5 @@
 import json
+import threading
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 from pathlib import Path
@@ -13,6 +14,11 @@ from app.gui.wbs_helpers import (
     split_levels,
 )
 from app.core.structural_engine import migrate_rule_v1_to_v2
+from app.core.model_registry import MODEL_BUSY_MSG
+
+PREVIEW_DELAY_MS = 300
+PREVIEW_POLL_MS  = 40
+PREVIEW_BUSY_MS  = 500
 
 
 def _parse_value_token(s: str):
@@ -29,16 +35,25 @@ def _parse_value_token(s: str):
     return s
 
 
+def _format_preview(count: int, total, counting: bool) -> str:
+    text = f"{count} elemento" + ("" if count == 1 else "s")
+    if not counting and total is not None:
+        text += f" · total {total:.2f}"
+    return text
+
+
 class FilterBlock(tk.LabelFrame):
 
     def __init__(self, parent, index: int, predefs_by_class: dict,
-                 on_remove, qty_type_var: tk.StringVar, free_mode: bool = False):
+                 on_remove, qty_type_var: tk.StringVar, free_mode: bool = False,
+                 on_change=None):
         super().__init__(parent, padx=6, pady=4)
         self.index           = index
         self.predefs_by_class = predefs_by_class
         self._on_remove      = on_remove
         self.qty_type_var    = qty_type_var
         self.free_mode       = free_mode
+        self._on_change      = on_change
         self.prop_rows: list = []
 
         self._build()
@@ -56,6 +71,8 @@ class FilterBlock(tk.LabelFrame):
         self._lbl_title.pack(side="left")
         tk.Button(hdr, text="Remover", fg="red",
                   command=self._do_remove).pack(side="right")
+        self._lbl_preview = tk.Label(hdr, text="", fg="#555", font=("Segoe UI", 8))
+        self._lbl_preview.pack(side="right", padx=(0, 8))
 
         tk.Label(self, text="IfcClass:").grid(row=1, column=0, sticky="e", padx=(0,6), pady=2)
         if self.free_mode:
@@ -108,6 +125,20 @@ class FilterBlock(tk.LabelFrame):
         self.q_prop = tk.Entry(self.qty_lf)
         self.q_prop.grid(row=1, column=1, sticky="we", pady=2)
 
+        for w in (self.ifc_class, self.predef, self.objtype, self.q_pset, self.q_prop):
+            self._watch(w)
+
+    def _watch(self, widget):
+        widget.bind("<KeyRelease>", self._changed, add="+")
+        widget.bind("<<ComboboxSelected>>", self._changed, add="+")
+
+    def _changed(self, *_):
+        if callable(self._on_change):
+            self._on_change()
+
+    def set_preview(self, text: str):
+        self._lbl_preview.configure(text=text)
+
     def _safe_update_qty_visibility(self):
         try:
             self._update_qty_visibility()
@@ -159,6 +190,8 @@ class FilterBlock(tk.LabelFrame):
         btn = tk.Button(row, text="✕", width=3,
                         command=lambda r=row: self._remove_prop_row(r))
         btn.grid(row=0, column=3)
+        for w in (e_pset, e_prop, e_val):
+            self._watch(w)
         if preset:
             e_pset.insert(0, preset.get("pset", ""))
             e_prop.insert(0, preset.get("prop", ""))
@@ -171,9 +204,10 @@ class FilterBlock(tk.LabelFrame):
             if r is row_widget:
                 r.destroy()
                 del self.prop_rows[i]
+                self._changed()
                 break
 
-    def get_data(self) -> dict:
+    def get_data(self, strict: bool = True) -> dict:
         ic  = (self.ifc_class.get() if isinstance(self.ifc_class, tk.Entry)
                else self.ifc_class.get() or "").strip()
         prd = (self.predef.get() if isinstance(self.predef, tk.Entry)
@@ -203,10 +237,11 @@ class FilterBlock(tk.LabelFrame):
         if self.qty_type_var.get() == "prop":
             qp  = self.q_pset.get().strip()
             qpr = self.q_prop.get().strip()
-            if not qp or not qpr:
+            if qp and qpr:
+                entry["quantity_detail"] = {"pset": qp, "prop": qpr}
+            elif strict:
                 raise ValueError(
                     f"Pset e Propriedade de quantidade são obrigatórios para '{ic}'.")
-            entry["quantity_detail"] = {"pset": qp, "prop": qpr}
 
         return entry
 
@@ -276,6 +311,11 @@ class QtyPage(tk.Frame):
         self._ifc_loaded   = False
         self._mode_confirmed = False
 
+        self._preview_job    = None
+        self._preview_gen    = 0
+        self._preview_result = None
+        self._rule_preview_var = tk.StringVar(value="")
+
         self.mode = "home"
 
         self._build_ui()
@@ -470,6 +510,8 @@ class QtyPage(tk.Frame):
         self._blocks_container.grid_columnconfigure(0, weight=1)
         tk.Button(self.filters_lf, text="+ Adicionar classe IFC",
                   command=lambda: self._add_filter_block()).pack(anchor="e", pady=(4,0))
+        tk.Label(self.filters_lf, textvariable=self._rule_preview_var,
+                 fg="#555", font=("Segoe UI", 9, "bold"), bg="white").pack(anchor="w")
 
         mat_lf = tk.LabelFrame(r, text="Material (opcional)", padx=8, pady=6, bg="white")
         mat_lf.grid(row=6, column=0, sticky="we", padx=8, pady=(0,4))
@@ -479,6 +521,7 @@ class QtyPage(tk.Frame):
         self._mat_lf = mat_lf
         self.material = ttk.Combobox(mat_lf, state="readonly", values=[])
         self.material.grid(row=0, column=1, sticky="we", pady=4)
+        self._watch_material()
 
         agr_lf = tk.LabelFrame(r, text="Propriedade de Agrupamento (opcional)",
                                padx=8, pady=6, bg="white")
@@ -543,6 +586,7 @@ class QtyPage(tk.Frame):
             if cur_mat:
                 self.material.insert(0, cur_mat)
         self.material.grid(row=0, column=1, sticky="we", pady=4)
+        self._watch_material()
         if is_project and cur_mat:
             try: self.material.set(cur_mat)
             except Exception: pass
@@ -570,11 +614,13 @@ class QtyPage(tk.Frame):
             on_remove=self._remove_filter_block,
             qty_type_var=self.qty_type_var,
             free_mode=free,
+            on_change=self._schedule_preview,
         )
         blk.grid(row=idx - 1, column=0, sticky="we", pady=(0, 4))
         self._filter_blocks.append(blk)
         if data:
             blk.load_from(data)
+        self._schedule_preview()
         return blk
 
     def _remove_filter_block(self, block: FilterBlock):
@@ -586,6 +632,7 @@ class QtyPage(tk.Frame):
             self._filter_blocks.remove(block)
             block.destroy()
             self._renumber_blocks()
+            self._schedule_preview()
 
     def _renumber_blocks(self):
         for i, blk in enumerate(self._filter_blocks, start=1):
@@ -599,7 +646,89 @@ class QtyPage(tk.Frame):
         self._filter_blocks.clear()
 
     def _on_qty_type_changed(self):
-        pass
+        self._schedule_preview()
+
+    def _watch_material(self):
+        self.material.bind("<<ComboboxSelected>>", self._schedule_preview, add="+")
+        self.material.bind("<KeyRelease>", self._schedule_preview, add="+")
+
+    # The preview runs the current form against the loaded model on a worker
+    # thread. Every edit bumps the generation, which both restarts the
+    # debounce and cancels whatever evaluation is still in flight.
+    def _schedule_preview(self, *_):
+        if self._preview_job is not None:
+            try: self.after_cancel(self._preview_job)
+            except Exception: pass
+        self._preview_gen += 1
+        self._preview_job = self.after(PREVIEW_DELAY_MS, self._start_preview)
+
+    def _start_preview(self):
+        self._preview_job = None
+        loaded = self._ifc_loaded and self.app.inv.ifc_file is not None
+        blocks, mappings = [], []
+        for blk in self._filter_blocks:
+            if not loaded:
+                blk.set_preview("")
+                continue
+            try:
+                mappings.append(blk.get_data(strict=False))
+                blocks.append(blk)
+            except ValueError:
+                blk.set_preview("—")
+        if not mappings:
+            self._rule_preview_var.set("")
+            return
+
+        rule = {
+            "mappings": mappings,
+            "material": self.material.get().strip(),
+            "quantity": {"type": self.qty_type_var.get()},
+        }
+        gen = self._preview_gen
+        threading.Thread(target=self._preview_worker, args=(gen, rule), daemon=True).start()
+        self.after(PREVIEW_POLL_MS, self._poll_preview, gen, blocks, rule)
+
+    # The model is shared with loads and report runs through the registry
+    # lock; while one of them holds it the preview waits and retries instead
+    # of blocking, so it never reads a model being replaced or skews a run's
+    # counters.
+    def _preview_worker(self, gen: int, rule: dict):
+        def cancelled():
+            return gen != self._preview_gen
+        with self.app.models.using(blocking=False) as inv:
+            if cancelled():
+                return
+            if inv is None:
+                result = {"busy": True}
+            else:
+                try:
+                    result = inv.preview_rule(rule, cancelled=cancelled)
+                except Exception as e:
+                    result = {"error": str(e)}
+        self._preview_result = (gen, result)
+
+    def _poll_preview(self, gen: int, blocks: list, rule: dict):
+        if gen != self._preview_gen:
+            return
+        done = self._preview_result
+        if done is None or done[0] != gen:
+            self.after(PREVIEW_POLL_MS, self._poll_preview, gen, blocks, rule)
+            return
+        result = done[1]
+        if result is None:
+            return
+        if result.get("busy"):
+            self._rule_preview_var.set("Pré-visualização em espera (modelo em uso)")
+            self._preview_job = self.after(PREVIEW_BUSY_MS, self._start_preview)
+            return
+        if "error" in result:
+            self._rule_preview_var.set(f"Pré-visualização indisponível: {result['error']}")
+            return
+        counting = rule["quantity"]["type"] == "count"
+        for blk, b in zip(blocks, result["blocks"]):
+            blk.set_preview(_format_preview(b["count"], b["total"], counting))
+        self._rule_preview_var.set(
+            "Total da regra: " + _format_preview(result["count"], result["total"], counting))
 
     def _load_ifc(self):
         path = (self.app.ifc_var.get() or "").strip()
@@ -608,26 +737,22 @@ class QtyPage(tk.Frame):
                                    "Selecione primeiro um ficheiro IFC (.ifc).")
             return
         try:
-            import ifcopenshell
-        except Exception:
-            messagebox.showerror("Mapeamento IFC", "Biblioteca 'ifcopenshell' em falta.")
-            return
-        try:
-            model = ifcopenshell.open(path)
+            with self.app.models.using(blocking=False) as inv:
+                if inv is None:
+                    messagebox.showwarning("Mapeamento IFC", MODEL_BUSY_MSG)
+                    return
+                self.app.ensure_ifc_loaded(path)
+                self.predefs_by_class = {c: inv.list_predefined_types(c)
+                                         for c in inv.list_classes()}
+                mats = inv.extract_all_materials()
         except Exception as e:
             messagebox.showerror("Mapeamento IFC", f"Falha a abrir o IFC:\n{e}")
             return
+        # A plain open keeps the tab responsive; the property columns are
+        # built off the Tk thread and the preview uses the value indexes
+        # until they are in place.
+        threading.Thread(target=self.app.models.build_columns, daemon=True).start()
 
-        from collections import defaultdict
-        c2p = defaultdict(set)
-        for el in (model.by_type("IfcProduct") or []):
-            pre = getattr(el, "PredefinedType", None)
-            c2p[el.is_a()].add(
-                pre.upper().strip() if isinstance(pre, str) else "NOTDEFINED")
-        self.predefs_by_class = {k: sorted(v) for k, v in c2p.items()}
-        self.app.inv.ifc_file = model
-
-        mats = self.app.inv.extract_all_materials()
         self.material.configure(values=sorted(mats.keys()))
         self.material.set("")
 
@@ -639,6 +764,7 @@ class QtyPage(tk.Frame):
             blk.predefs_by_class = self.predefs_by_class
 
         self._ifc_loaded = True
+        self._schedule_preview()
         self._top_container.pack(fill="x", before=self._nav_anchor)
         self._list_container.pack(fill="both", expand=True)
         if self._is_leaf_selected():
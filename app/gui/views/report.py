@@ -9,6 +9,9 @@ import pandas as pd
 
 from app.gui.wbs_helpers import find_wbs_columns, unpack_core_columns, split_levels
 from app.core.structural_engine import load_and_migrate_rules, migrate_rule_v1_to_v2
+from app.core.report_pipeline import export_elements_csv, export_elements_parquet
+from app.core.model_registry import MODEL_BUSY_MSG
+from app.gui.log_channel import LOG_POLL_MS, LogChannel, format_progress
 
 import ifcopenshell
 
@@ -81,6 +84,11 @@ class ReportPage(tk.Frame):
         self.e_out.grid(row=4, column=1, sticky="we", **pad)
         self.b_out_pick = tk.Button(self, text="Procurar…", command=self.browse_outdir)
         self.b_out_pick.grid(row=4, column=2, sticky="w", **pad)
+        self.chk_pool = tk.Checkbutton(
+            self, text=f"Processos paralelos ({self.app.workers})",
+            variable=self.app.use_process_pool,
+        )
+        self.chk_pool.grid(row=4, column=3, sticky="w", **pad)
 
         self.run_btn = tk.Button(self, text="Gerar WBS preenchido", command=self.on_run)
         self.run_btn.grid(row=5, column=0, columnspan=2, sticky="we", padx=(10, 4), pady=(8, 6))
@@ -89,11 +97,22 @@ class ReportPage(tk.Frame):
             self, text="Exportar CSV detalhado",
             state="disabled", command=self.on_export_csv,
         )
-        self.btn_export_csv.grid(row=5, column=2, columnspan=2, sticky="we", padx=(4, 10), pady=(8, 6))
+        self.btn_export_csv.grid(row=5, column=2, sticky="we", padx=(4, 4), pady=(8, 6))
+
+        self.btn_export_parquet = tk.Button(
+            self, text="Exportar Parquet",
+            state="disabled", command=self.on_export_parquet,
+        )
+        self.btn_export_parquet.grid(row=5, column=3, sticky="we", padx=(4, 10), pady=(8, 6))
+
+        self.progress = ttk.Progressbar(self, mode="determinate", maximum=1)
+        self.progress.grid(row=6, column=0, columnspan=3, sticky="we", padx=(10, 4), pady=(2, 2))
+        self.lbl_progress = tk.Label(self, anchor="w", text="")
+        self.lbl_progress.grid(row=6, column=3, sticky="we", padx=(4, 10), pady=(2, 2))
 
         self.log = ScrolledText(self, height=14, state="disabled")
-        self.log.grid(row=6, column=0, columnspan=4, sticky="nsew", padx=10, pady=(4, 10))
-        self.grid_rowconfigure(6, weight=1)
+        self.log.grid(row=7, column=0, columnspan=4, sticky="nsew", padx=10, pady=(4, 10))
+        self.grid_rowconfigure(7, weight=1)
 
     def set_mode(self, source: str = "home"):
         self._mode = source or "home"
@@ -166,12 +185,17 @@ class ReportPage(tk.Frame):
             ifc_path_str = (getattr(app, "ifc_var", None) or tk.StringVar()).get()
             if ifc_path_str:
                 self.ifc_var.set(ifc_path_str)
-            if getattr(app, "ifc_file", None) is None and ifc_path_str and Path(ifc_path_str).is_file():
-                self._log("Carregando IFC automaticamente...\n")
-                app.inv.open_ifc(ifc_path_str)
-                app.ifc_path_loaded = ifc_path_str
-                app.ifc_file        = app.inv.ifc_file
-                loaded.append(f"[OK] IFC: {Path(ifc_path_str).name}")
+            if ifc_path_str and Path(ifc_path_str).is_file():
+                # Runs on the Tk thread: never wait for a report holding the model.
+                with app.models.using(blocking=False) as inv:
+                    if inv is None:
+                        warns.append(f"[X] IFC: {MODEL_BUSY_MSG}")
+                    elif app.models.is_loaded(ifc_path_str):
+                        loaded.append("[OK] IFC (já em memória)")
+                    else:
+                        self._log("Carregando IFC automaticamente...\n")
+                        app.ensure_ifc_loaded(ifc_path_str)
+                        loaded.append(f"[OK] IFC: {Path(ifc_path_str).name}")
             elif getattr(app, "ifc_file", None) is not None:
                 loaded.append("[OK] IFC (já em memória)")
             else:
@@ -303,9 +327,11 @@ class ReportPage(tk.Frame):
             messagebox.showerror("Extrair quantidades", "Selecione primeiro um ficheiro IFC válido.")
             return
         try:
-            self.app.inv.open_ifc(path)
-            self.app.ifc_path_loaded = path
-            self.app.ifc_file        = self.app.inv.ifc_file
+            with self.app.models.using(blocking=False) as inv:
+                if inv is None:
+                    messagebox.showwarning("Extrair quantidades", MODEL_BUSY_MSG)
+                    return
+                self.app.ensure_ifc_loaded(path)
             messagebox.showinfo("Extrair quantidades", "IFC carregado com sucesso.")
         except Exception as e:
             messagebox.showerror("Extrair quantidades", f"Falha a abrir o IFC:\n{e}")
@@ -333,145 +359,84 @@ class ReportPage(tk.Frame):
             return
 
         def done(msg):
-            messagebox.showinfo("Extrair quantidades", msg)
-            self.run_btn.configure(state="normal", text="Gerar WBS preenchido")
+            try:
+                messagebox.showinfo("Extrair quantidades", msg)
+            finally:
+                self.run_btn.configure(state="normal", text="Gerar WBS preenchido")
 
         if hasattr(self.app, "run_generate_report"):
-            self.after(10, lambda: self.app.run_generate_report(self.log, on_finish=done))
+            channel = LogChannel()
+            self.progress.configure(value=0, maximum=1)
+            self.lbl_progress.config(text="")
+            self.app.run_generate_report(channel, on_finish=done)
+            self.after(LOG_POLL_MS, self._drain_log, channel)
             return
 
         self._log("Pipeline não encontrado. (fallback)\n")
         done("Fluxo testado.")
 
     def on_export_csv(self):
-        import csv as csv_mod
-
         cache = getattr(self.app, "_last_csv_cache", None)
         if not isinstance(cache, dict):
             messagebox.showinfo("Extrair quantidades", "Gere primeiro os ficheiros de output.")
             return
 
-        headers         = [h for h in cache["headers"] if h != "wbs_group"]
-        per_code        = cache["per_code"]
-        units_by_parent = cache.get("code_to_unit", {})
-        wbs_rows        = cache.get("wbs_rows", [])
-        code_ext        = getattr(self.app, "last_code_extensions", {})
-
+        code_ext     = getattr(self.app, "last_code_extensions", {})
         out_dir      = Path(self.app.out_var.get().strip() or Path.home())
         ifc_path_str = self.ifc_var.get().strip() or getattr(self.app, "ifc_path_loaded", "") or ""
         ifc_stem     = Path(ifc_path_str).stem if ifc_path_str else "output"
-        ifc_filename = ifc_stem
-
-        out_csv = out_dir / f"ElementosQuantificados_{ifc_stem}.csv"
-        n = 1
-        while out_csv.exists():
-            out_csv = out_dir / f"ElementosQuantificados_{ifc_stem}({n}).csv"
-            n += 1
 
         try:
-            all_rows = []
-
-            found_codes = {
-                code for code, blob in per_code.items()
-                if not blob.get("no_elements")
-            }
-
-            ancestor_codes = set()
-            for code in found_codes:
-                parts = code.split(".")
-                for k in range(1, len(parts)):
-                    ancestor_codes.add(".".join(parts[:k]))
-
-            for entry in wbs_rows:
-                code = entry.get("wbs_codigo", "")
-                if code in ancestor_codes:
-                    row = {h: "" for h in headers}
-                    row["wbs_codigo"] = code
-                    row["descricao"]  = entry.get("descricao", "")
-                    all_rows.append(row)
-
-            parent_order = sorted(
-                found_codes,
-                key=lambda c: ReportPage._parse_wbs_code(c)
-            )
-
-            for parent in parent_order:
-                blob      = per_code.get(parent, {})
-                meta      = blob.get("meta", {})
-                desc_ext  = code_ext.get(parent, {}).get("desc", f"{parent}.01")
-                group_map = code_ext.get(parent, {}).get("groups", {})
+            export_elements_csv(cache, code_ext, out_dir, ifc_stem)
+            messagebox.showinfo("Extrair quantidades", "Um ficheiro exportado com sucesso.")
+        except Exception as e:
+            messagebox.showerror("Erro", f"Falha ao exportar CSV:\n{e}")
 
-                if blob.get("no_elements"):
-                    continue
+    def on_export_parquet(self):
+        cache = getattr(self.app, "_last_csv_cache", None)
+        if not isinstance(cache, dict):
+            messagebox.showinfo("Extrair quantidades", "Gere primeiro os ficheiros de output.")
+            return
 
-                user_desc = next(
-                    (e.get("descricao", "") for e in wbs_rows
-                     if e.get("wbs_codigo") == parent),
-                    ""
-                )
-                row = {h: "" for h in headers}
-                row["ifc_filename"] = ifc_filename
-                row["wbs_codigo"]   = desc_ext
-                row["descricao"]    = user_desc
-                all_rows.append(row)
-
-                groups = blob.get("groups", {})
-                if group_map:
-                    sorted_groups = sorted(
-                        groups.items(),
-                        key=lambda kv: ReportPage._parse_wbs_code(
-                            group_map.get(kv[0], "zzz"))
-                    )
-                else:
-                    sorted_groups = list(groups.items())
-
-                for gi, (gval, elems) in enumerate(sorted_groups, start=1):
-                    element_code = group_map.get(gval) or f"{desc_ext}.{gi:02d}"
-                    for el in elems:
-                        row = {h: "" for h in headers}
-                        row["ifc_filename"]        = ifc_filename
-                        row["wbs_codigo"]          = element_code
-                        row["descricao"]           = gval or "n/a"
-                        row["ifc_class"]           = el.get("ifc_class",           "n/a")
-                        row["predefinedtype"]       = el.get("predefined",          "n/a")
-                        row["objecttype"]          = el.get("objecttype",           "n/a")
-                        row["material"]            = el.get("material",             "n/a")
-                        row["ifc_guid"]            = el.get("guid",                 "n/a")
-                        row["buildingstorey"]      = el.get("buildingstorey",       "n/a")
-                        row["classification_code"] = el.get("classification_code",  "n/a")
-                        row["ifc_project"]         = meta.get("ifc_project",        "n/a")
-                        row["ifc_site"]            = meta.get("ifc_site",           "n/a")
-                        row["ifc_building"]        = meta.get("ifc_building",       "n/a")
-                        row["ifc_valor"]           = el.get("value",                "")
-                        row["unidade"]             = units_by_parent.get(parent,    "")
-                        row["qty_type"]            = el.get("qty_type",             "prop")
-                        all_rows.append(row)
-
-            all_rows.sort(key=lambda r: ReportPage._parse_wbs_code(r.get("wbs_codigo", "")))
-
-            with open(out_csv, "w", newline="", encoding="utf-8-sig") as f:
-                w = csv_mod.DictWriter(f, fieldnames=headers)
-                w.writeheader()
-                for row in all_rows:
-                    w.writerow(row)
+        code_ext     = getattr(self.app, "last_code_extensions", {})
+        out_dir      = Path(self.app.out_var.get().strip() or Path.home())
+        ifc_path_str = self.ifc_var.get().strip() or getattr(self.app, "ifc_path_loaded", "") or ""
+        ifc_stem     = Path(ifc_path_str).stem if ifc_path_str else "output"
 
+        try:
+            export_elements_parquet(cache, code_ext, out_dir, ifc_stem)
             messagebox.showinfo("Extrair quantidades", "Um ficheiro exportado com sucesso.")
+        except Exception as e:
+            messagebox.showerror("Erro", f"Falha ao exportar Parquet:\n{e}")
 
+    def _drain_log(self, channel: LogChannel):
+        # A failing widget update or callback is logged and must never stop
+        # the polling, or the rest of the run (and the button re-enable) is lost.
+        batch = {"closed": False}
+        try:
+            batch = channel.drain()
+            if batch["text"]:
+                self._log(batch["text"])
+            event = batch["progress"]
+            if event is not None:
+                self.progress.configure(maximum=max(event["total"], 1), value=event["done"])
+                self.lbl_progress.config(text=format_progress(event))
+            for fn, args in batch["calls"]:
+                try:
+                    fn(*args)
+                except Exception as e:
+                    self._log(f"Erro na interface: {e}")
         except Exception as e:
-            messagebox.showerror("Erro", f"Falha ao exportar CSV:\n{e}")
+            try:
+                self._log(f"Erro na interface: {e}")
+            except Exception:
+                pass
+        finally:
+            if not batch["closed"]:
+                self.after(LOG_POLL_MS, self._drain_log, channel)
 
     def _log(self, text: str):
         self.log.configure(state="normal")
         self.log.insert("end", text + ("\n" if not text.endswith("\n") else ""))
         self.log.see("end")
         self.log.configure(state="disabled")
-
-    @staticmethod
-    def _parse_wbs_code(code: str) -> tuple:
-        if not code or not isinstance(code, str):
-            return (float("inf"),)
-        parts = []
-        for part in code.split("."):
-            part = part.strip()
-            parts.append(int(part) if part.isdigit() else part)
-        return tuple(parts)
@@ -570,7 +570,8 @@ class WBSPage(tk.Frame):
 
         try:
             df       = self.app.df_raw
-            niv      = split_levels(df, self.app.col_nivel)
+            index    = self.app.get_wbs_index()
+            niv      = index.levels
             baseline = (self.app.df_desc0
                         if self.app.df_desc0 is not None
                         else df[self.app.col_desc].copy())
@@ -578,12 +579,6 @@ class WBSPage(tk.Frame):
             def norm(v):
                 return "" if pd.isna(v) else str(v).strip()
 
-            code_to_idx = {}
-            for i, code in enumerate(df[self.app.col_wbs]):
-                lvl = niv.iat[i]
-                if lvl is not None and lvl < 10 and isinstance(code, str) and code.strip():
-                    code_to_idx[str(code).strip()] = i
-
             include_idx = set()
             last_code = None; last_code_idx = None
 
@@ -601,7 +596,7 @@ class WBSPage(tk.Frame):
                         include_idx.add(i)
                         include_idx.add(last_code_idx)
                         for anc in list_ancestors(last_code):
-                            j = code_to_idx.get(anc)
+                            j = index.leaf_row(anc)
                             if j is not None:
                                 include_idx.add(j)
 
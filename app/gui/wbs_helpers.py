@@ -45,6 +45,11 @@ def find_wbs_columns(df: pd.DataFrame) -> dict:
     return result
 
 
+def read_wbs_excel(path, header: int = 1):
+    df = pd.read_excel(path, header=header)
+    return df, find_wbs_columns(df)
+
+
 def unpack_core_columns(cols: dict):
     return cols["col_wbs"], cols["col_desc"], cols["col_nivel"]
 
@@ -60,6 +65,94 @@ def split_levels(df: pd.DataFrame, col_nivel: str):
     return df[col_nivel].apply(to_int)
 
 
+class WBSIndex:
+
+    UNIT_CANDIDATES = ["UNIDADES", "UNID.", "UNID", "UNIT"]
+
+    def __init__(self, df: pd.DataFrame, cols: dict):
+        self.df        = df
+        self.cols      = cols
+        self.col_wbs   = cols.get("col_wbs")
+        self.col_desc  = cols.get("col_desc")
+        self.col_nivel = cols.get("col_nivel")
+        self.levels    = split_levels(df, self.col_nivel)
+
+        # Positions are row numbers; the WBS frames are always RangeIndex.
+        codes = df[self.col_wbs].astype(str).str.strip().tolist()
+        self._leaf_row  = {}
+        self._first_row = {}
+        for i, code in enumerate(codes):
+            self._first_row.setdefault(code, i)
+            lvl = self.levels.iat[i]
+            if lvl is not None and lvl < 10:
+                self._leaf_row.setdefault(code, i)
+
+        n = self._n_rows = len(df)
+        self._desc_row = {}
+        for code, i in self._leaf_row.items():
+            if i + 1 < n and self.levels.iat[i + 1] == 10:
+                self._desc_row[code] = i + 1
+
+        self.parent   = {}
+        self.children = {}
+        for code in self._leaf_row:
+            for anc in reversed(list_ancestors(code)):
+                if anc in self._leaf_row:
+                    self.parent[code] = anc
+                    self.children.setdefault(anc, []).append(code)
+                    break
+
+        self._unit_cols = [c for c in self.UNIT_CANDIDATES if c in df.columns]
+        col_u = cols.get("col_unidades")
+        if col_u and col_u in df.columns:
+            self._unit_cols = [col_u] + self._unit_cols
+
+    def __contains__(self, code) -> bool:
+        return code in self._leaf_row
+
+    def is_current(self, df) -> bool:
+        # The editor inserts level-10 rows in place, so identity is not enough.
+        return df is self.df and len(df) == self._n_rows
+
+    def leaf_row(self, code):
+        return self._leaf_row.get(code)
+
+    def desc_row(self, code):
+        return self._desc_row.get(code)
+
+    def first_row(self, code):
+        return self._first_row.get(code)
+
+    def desc_and_unit(self, code):
+        if code not in self._leaf_row:
+            return "", "n/a"
+        j = self._desc_row.get(code)
+        if j is None:
+            return "", "n/a"
+        desc = str(self.df.iat[j, self.df.columns.get_loc(self.col_desc)]) \
+            if self.col_desc in self.df.columns else ""
+        unit = ""
+        for uc in self._unit_cols:
+            val = self.df.iat[j, self.df.columns.get_loc(uc)]
+            if pd.notna(val) and str(val).strip() not in ("", "n/a", "nan"):
+                unit = str(val).strip()
+                break
+        return desc, unit
+
+    def wbs_rows(self) -> list[dict]:
+        rows = []
+        wbs  = self.df[self.col_wbs].tolist()
+        desc = self.df[self.col_desc].tolist()
+        for i, lvl in enumerate(self.levels.tolist()):
+            if lvl is None or not lvl < 10:
+                continue
+            code = str(wbs[i]).strip() if pd.notna(wbs[i]) else ""
+            text = str(desc[i]).strip() if pd.notna(desc[i]) else ""
+            if code:
+                rows.append({"wbs_codigo": code, "descricao": text})
+        return rows
+
+
 def children_at_level(df, col_nivel, col_wbs, col_desc, prefix, level):
     if level == 1 or prefix is None:
         sub = df[df[col_nivel] == 1][[col_wbs, col_desc]].dropna(subset=[col_wbs])
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmarks do motor estrutural sobre modelos IFC4 sintéticos.
+
+    python -m benchmarks.run --size 10000
+    python -m benchmarks.run --size 100000 --out depois.json --compare antes.json
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import ifcopenshell
+
+from app.core.structural_engine import IFCInvestigator
+from benchmarks.synthetic_model import (
+    MATERIALS,
+    PRODUCT_MIX,
+    PSET_NAME,
+    QTO_NAME,
+    ensure_model,
+)
+
+BENCH_DIR  = Path(__file__).resolve().parent
+MODELS_DIR = BENCH_DIR / ".models"
+RESULTS_DIR = BENCH_DIR / "results"
+
+REFERENCES_PER_CLASS = 10
+
+
+def _git_commit() -> str:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR,
+                             capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def _timed(fn, setup=None, repeat: int = 3) -> dict:
+    runs = []
+    items = None
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        t0 = time.perf_counter()
+        items = fn()
+        runs.append(time.perf_counter() - t0)
+    return {"min": min(runs), "median": statistics.median(runs), "runs": runs, "items": items}
+
+
+def _prop_filters() -> list:
+    specs = []
+    for ifc_class, predefs, _ in PRODUCT_MIX:
+        for k in range(REFERENCES_PER_CLASS):
+            specs.append({
+                "ifc_class": ifc_class,
+                "predefined": predefs[0] or "NOTDEFINED",
+                "props": [
+                    {"pset": PSET_NAME, "prop": "Reference", "value": f"R{k:03d}"},
+                    {"pset": PSET_NAME, "prop": "IsExternal", "value": k % 2 == 0},
+                ],
+            })
+    return specs
+
+
+def sweep_rules() -> dict:
+    rules = {}
+    for ci, (ifc_class, predefs, _) in enumerate(PRODUCT_MIX, start=1):
+        for pi, predef in enumerate(predefs, start=1):
+            for k in range(REFERENCES_PER_CLASS):
+                name, category = MATERIALS[k % len(MATERIALS)]
+                rules[f"{ci:02d}.{pi:02d}.{k + 1:02d}"] = {
+                    "mappings": [{
+                        "filter": {
+                            "ifc_class": ifc_class,
+                            "predefined": predef or "NOTDEFINED",
+                            "props": [{"pset": PSET_NAME, "prop": "Reference",
+                                       "value": f"R{k:03d}"}],
+                        },
+                        "quantity_detail": {"pset": QTO_NAME, "prop": "NetVolume"},
+                    }],
+                    "material": category if k % 2 else "",
+                    "quantity": {"type": "count" if ifc_class in ("IfcDoor", "IfcWindow") else "prop"},
+                    "agrupamento": {"pset": PSET_NAME, "prop": "Zone"},
+                }
+    return rules
+
+
+def _cold(inv):
+    def setup():
+        inv._reset_filter_memo()
+        inv.clear_pset_cache()
+        if inv.property_columns is not None:
+            inv.property_columns.clear_derived()
+    return setup
+
+
+def _open(path: str, indexed: bool) -> int:
+    inv = IFCInvestigator()
+    inv.open_ifc(path, indexed=indexed)
+    return sum(len(els) for els in inv.index_by_class.values())
+
+
+def run_benchmarks(path, repeat: int = 3, log=print) -> dict:
+    path = str(path)
+    results = {}
+
+    def bench(name, fn, setup=None):
+        results[name] = r = _timed(fn, setup, repeat)
+        log(f"  {name:<32} {r['min'] * 1000:10.1f} ms  (mediana {r['median'] * 1000:.1f} ms)")
+
+    bench("open_ifc", lambda: _open(path, indexed=False))
+    bench("open_ifc_indexed", lambda: _open(path, indexed=True))
+
+    plain = IFCInvestigator()
+    plain.open_ifc(path)
+    indexed = IFCInvestigator()
+    indexed.open_ifc(path, indexed=True)
+    products = list(plain.ifc_file.by_type("IfcProduct"))
+    specs = _prop_filters()
+
+    for label, inv in (("", plain), ("_indexed", indexed)):
+        bench(f"filter_single_props{label}",
+              lambda inv=inv: sum(len(inv._filter_single(s)) for s in specs), _cold(inv))
+
+    walls = indexed.index_by_class.get("IfcWall", []) + indexed.index_by_class.get("IfcSlab", [])
+    mat_filters = ([c for _, c in MATERIALS]
+                   + [{"category": "", "name": n} for n, _ in MATERIALS])
+    bench("apply_material_filter",
+          lambda: sum(len(indexed._apply_material_filter(walls, m)) for m in mat_filters))
+
+    for label, inv in (("", plain), ("_indexed", indexed)):
+        groups = [inv.index_by_class[t] for t in inv.index_by_class]
+        bench(f"sum_quantity{label}",
+              lambda inv=inv, groups=groups: sum(
+                  len(inv.sum_quantity(g, QTO_NAME, "NetVolume")[1]) for g in groups),
+              _cold(inv))
+
+    for label, inv in (("", plain), ("_indexed", indexed)):
+        bench(f"get_building_storey{label}",
+              lambda inv=inv: sum(1 for e in products if inv.get_building_storey(e) != "n/a"))
+
+    rules = sweep_rules()
+    for label, inv in (("", plain), ("_indexed", indexed)):
+        bench(f"extract_quantities_sweep{label}",
+              lambda inv=inv: sum(len(inv.extract_quantities(r)[1]) for r in rules.values()),
+              _cold(inv))
+
+    return results
+
+
+def compare(current: dict, baseline: dict) -> list:
+    lines = [f"{'benchmark':<34} {'antes':>10} {'depois':>10} {'razão':>8}"]
+    for name, r in current["results"].items():
+        old = baseline.get("results", {}).get(name)
+        if old is None:
+            continue
+        ratio = r["min"] / old["min"] if old["min"] else float("inf")
+        lines.append(f"{name:<34} {old['min'] * 1000:9.1f}ms {r['min'] * 1000:9.1f}ms {ratio:7.2f}x")
+    return lines
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.run",
+        description="Benchmarks do motor estrutural sobre um modelo IFC4 sintético.",
+    )
+    parser.add_argument("--size", type=int, default=10_000, help="Número de produtos do modelo")
+    parser.add_argument("--seed", type=int, default=0, help="Semente do gerador")
+    parser.add_argument("--repeat", type=int, default=3, help="Repetições por benchmark")
+    parser.add_argument("--model", help="Usar este IFC em vez do modelo sintético")
+    parser.add_argument("--out", help="Ficheiro JSON de resultados")
+    parser.add_argument("--compare", help="JSON de uma execução anterior para comparar")
+    args = parser.parse_args(argv)
+
+    if args.model:
+        path = Path(args.model)
+    else:
+        path = MODELS_DIR / f"synthetic_{args.size}_{args.seed}.ifc"
+        if not path.is_file():
+            print(f"A gerar {path.name}…", flush=True)
+        ensure_model(path, args.size, seed=args.seed)
+
+    commit = _git_commit()
+    print(f"Modelo: {path.name} | commit {commit}", flush=True)
+    results = run_benchmarks(path, repeat=args.repeat,
+                             log=lambda m: print(m, flush=True))
+
+    report = {
+        "meta": {
+            "commit":      commit,
+            "date":        datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "model":       path.name,
+            "size":        None if args.model else args.size,
+            "seed":        None if args.model else args.seed,
+            "repeat":      args.repeat,
+            "python":      platform.python_version(),
+            "ifcopenshell": ifcopenshell.version,
+            "platform":    platform.platform(),
+        },
+        "results": results,
+    }
+    out = Path(args.out) if args.out else RESULTS_DIR / f"{commit}_{path.stem}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print(f"\nResultados: {out}")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        print("\n" + "\n".join(compare(report, baseline)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Gerador de modelos IFC4 sintéticos para os benchmarks do motor estrutural.
+
+    python -m benchmarks.synthetic_model --size 100000 modelo.ifc
+"""
+
+import argparse
+import random
+import sys
+import time
+import uuid
+from pathlib import Path
+
+import ifcopenshell
+import ifcopenshell.api as api
+
+# (class, predefined types, share of the products)
+PRODUCT_MIX = [
+    ("IfcWall",                 ["SOLIDWALL", "PARTITIONING", "USERDEFINED"], 0.30),
+    ("IfcSlab",                 ["FLOOR", "ROOF"],                            0.15),
+    ("IfcBeam",                 ["BEAM"],                                     0.15),
+    ("IfcColumn",               ["COLUMN"],                                   0.10),
+    ("IfcDoor",                 ["DOOR"],                                     0.10),
+    ("IfcWindow",               ["WINDOW"],                                   0.10),
+    ("IfcBuildingElementProxy", [None],                                       0.10),
+]
+
+OBJECT_TYPES = ["MURO_CORTINA", "MURO_GESSO"]
+
+MATERIALS = [
+    ("C30/37", "Concrete"), ("C25/30", "Concrete"), ("S275", "Steel"),
+    ("S355", "Steel"), ("Pinho", "Wood"), ("Tijolo", "Masonry"),
+    ("Vidro", "Glass"), ("Gesso", "Plaster"),
+]
+
+CLASSIFICATION = "Uniclass"
+PSET_NAME      = "Pset_Synthetic"
+QTO_NAME       = "Qto_Synthetic"
+FIRE_RATINGS   = ["EI30", "EI60", "EI90", "EI120"]
+
+
+def _chunks(rng, items: list, n_groups: int) -> list:
+    # Random but reproducible partition of items into n_groups groups.
+    groups = [[] for _ in range(n_groups)]
+    for item in items:
+        groups[rng.randrange(n_groups)].append(item)
+    return [g for g in groups if g]
+
+
+def build_model(size: int, seed: int = 0, storeys: int = 10,
+                pset_variants: int = 50, qto_variants: int = 200,
+                classifications: int = 20) -> ifcopenshell.file:
+    rng = random.Random(seed)
+    f = ifcopenshell.file(schema="IFC4")
+    project  = api.run("root.create_entity", f, ifc_class="IfcProject", name="Benchmark")
+    site     = api.run("root.create_entity", f, ifc_class="IfcSite", name="Site")
+    building = api.run("root.create_entity", f, ifc_class="IfcBuilding", name="Building")
+    api.run("aggregate.assign_object", f, products=[site], relating_object=project)
+    api.run("aggregate.assign_object", f, products=[building], relating_object=site)
+    levels = [api.run("root.create_entity", f, ifc_class="IfcBuildingStorey", name=f"Piso {i}")
+              for i in range(storeys)]
+    api.run("aggregate.assign_object", f, products=levels, relating_object=building)
+
+    counts = [int(size * share) for _, _, share in PRODUCT_MIX]
+    counts[0] += size - sum(counts)
+    products = []
+    for (ifc_class, predefs, _), count in zip(PRODUCT_MIX, counts):
+        for _ in range(count):
+            predef = rng.choice(predefs)
+            e = api.run("root.create_entity", f, ifc_class=ifc_class, predefined_type=predef)
+            e.GlobalId = ifcopenshell.guid.compress(uuid.UUID(int=rng.getrandbits(128)).hex)
+            if predef == "USERDEFINED":
+                e.ObjectType = rng.choice(OBJECT_TYPES)
+            products.append(e)
+
+    # Relationships are shared between groups of products so that building a
+    # large model stays linear: one pset, qto, material or reference instance
+    # per group, assigned with a single API call.
+    for level, group in zip(levels, _chunks(rng, products, storeys)):
+        api.run("spatial.assign_container", f, products=group, relating_structure=level)
+
+    for k, group in enumerate(_chunks(rng, products, pset_variants)):
+        pset = api.run("pset.add_pset", f, product=group[0], name=PSET_NAME)
+        api.run("pset.edit_pset", f, pset=pset, properties={
+            "Reference":  f"R{k:03d}",
+            "IsExternal": k % 3 == 0,
+            "FireRating": FIRE_RATINGS[k % len(FIRE_RATINGS)],
+            "Zone":       f"Z{k % 5}",
+        })
+        if len(group) > 1:
+            api.run("pset.assign_pset", f, products=group[1:], pset=pset)
+
+    for group in _chunks(rng, products, qto_variants):
+        qto = api.run("pset.add_qto", f, product=group[0], name=QTO_NAME)
+        api.run("pset.edit_qto", f, qto=qto, properties={
+            "NetVolume": round(rng.uniform(0.1, 20.0), 3),
+            "NetArea":   round(rng.uniform(0.5, 60.0), 3),
+            "Length":    round(rng.uniform(0.5, 12.0), 3),
+        })
+        if len(group) > 1:
+            api.run("pset.assign_pset", f, products=group[1:], pset=qto)
+
+    materials = [api.run("material.add_material", f, name=n, category=c) for n, c in MATERIALS]
+    layered = api.run("material.add_material_set", f, name="Parede dupla",
+                      set_type="IfcMaterialLayerSet")
+    api.run("material.add_layer", f, layer_set=layered, material=materials[5])
+    api.run("material.add_layer", f, layer_set=layered, material=materials[7])
+    for k, group in enumerate(_chunks(rng, products, len(materials) + 1)):
+        if k == len(materials):
+            api.run("material.assign_material", f, products=group,
+                    type="IfcMaterialLayerSet", material=layered)
+        else:
+            api.run("material.assign_material", f, products=group,
+                    type="IfcMaterial", material=materials[k])
+
+    system = api.run("classification.add_classification", f, classification=CLASSIFICATION)
+    for k, group in enumerate(_chunks(rng, products, classifications)):
+        api.run("classification.add_reference", f, products=group,
+                identification=f"EF_{k:02d}", name=f"Elemento {k}", classification=system)
+
+    return f
+
+
+def ensure_model(path, size: int, seed: int = 0, **kwargs) -> Path:
+    path = Path(path)
+    if not path.is_file():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        build_model(size, seed=seed, **kwargs).write(str(path))
+    return path
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.synthetic_model",
+        description="Gerar um modelo IFC4 sintético para benchmarks.",
+    )
+    parser.add_argument("out", help="Ficheiro IFC de saída")
+    parser.add_argument("--size", type=int, default=10_000, help="Número de produtos")
+    parser.add_argument("--seed", type=int, default=0, help="Semente aleatória")
+    parser.add_argument("--storeys", type=int, default=10, help="Número de pisos")
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+    build_model(args.size, seed=args.seed, storeys=args.storeys).write(args.out)
+    print(f"{args.out}: {args.size} produtos em {time.perf_counter() - t0:.1f} s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
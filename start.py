@@ -8,6 +8,7 @@ Entry point da aplicação
 
 import sys
 import os
+import multiprocessing
 
 if sys.version_info < (3, 9):
     print("ERRO: Python 3.9 ou superior é necessário")
@@ -25,6 +26,7 @@ except ImportError:
 from app.gui.main import main
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     try:
         main()
     except KeyboardInterrupt:
@@ -0,0 +1,45 @@
+import subprocess
+import pytest
+import sys, os
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+from app.cli import build_parser, main
+
+
+class TestCli:
+
+    def test_import_does_not_load_tkinter(self):
+        code = "import sys, app.cli; sys.exit(1 if 'tkinter' in sys.modules else 0)"
+        proc = subprocess.run([sys.executable, "-c", code], cwd=ROOT)
+        assert proc.returncode == 0
+
+    def test_extract_requires_all_inputs(self):
+        with pytest.raises(SystemExit):
+            build_parser().parse_args(["extract", "--wbs", "a.xlsx"])
+
+    def test_extract_arguments(self):
+        args = build_parser().parse_args([
+            "extract", "--wbs", "a.xlsx", "--map", "m.json",
+            "--ifc", "model.ifc", "--out", "out",
+        ])
+        assert args.command == "extract"
+        assert args.no_csv is False
+        assert args.parquet is False
+        assert args.workers == 1
+
+    def test_diff_arguments(self):
+        args = build_parser().parse_args([
+            "diff", "--map", "m.json", "--old", "r1.ifc", "--new", "r2.ifc",
+            "--out", "out", "--workers", "1",
+        ])
+        assert (args.command, args.old, args.new, args.workers) == ("diff", "r1.ifc", "r2.ifc", 1)
+
+    def test_missing_file_returns_error_code(self, tmp_path, capsys):
+        rc = main([
+            "extract", "--wbs", str(tmp_path / "nope.xlsx"), "--map", "m.json",
+            "--ifc", "model.ifc", "--out", str(tmp_path),
+        ])
+        assert rc == 1
+        assert "WBS" in capsys.readouterr().err
@@ -0,0 +1,39 @@
+import sys, os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.core.detail_spool import DetailSpool
+
+
+def _rec(guid, value, group=None):
+    return {"guid": guid, "value": value, "ifc_class": "IfcWall",
+            "predefined": "SOLIDWALL", "objecttype": "n/a", "material": "Betão",
+            "classification_code": "n/a", "buildingstorey": "Piso 0",
+            "group_value": group}
+
+
+class TestDetailSpool:
+
+    def test_blocks_per_code(self, tmp_path):
+        spool = DetailSpool(tmp_path)
+        spool.write("01.01", [_rec("A", 1.5), _rec("B", None, "Z1")], "prop")
+        spool.write("01.02", [_rec("C", 1)], "count")
+        blocks = list(spool.iter_codes())
+        assert [c for c, _ in blocks] == ["01.01", "01.02"]
+        a, b = blocks[0][1]
+        assert (a["guid"], a["value"], a["group_value"]) == ("A", "1.5", "")
+        assert (b["value"], b["group_value"], b["qty_type"]) == ("", "Z1", "prop")
+        assert blocks[1][1][0]["qty_type"] == "count"
+        assert spool.count == 3
+
+    def test_can_be_read_twice(self, tmp_path):
+        spool = DetailSpool(tmp_path)
+        spool.write("01", [_rec("A", 2.0)], "prop")
+        assert list(spool.iter_codes()) == list(spool.iter_codes())
+
+    def test_discard_removes_file(self, tmp_path):
+        spool = DetailSpool(tmp_path)
+        spool.write("01", [_rec("A", 2.0)], "prop")
+        assert os.path.exists(spool.path)
+        spool.discard()
+        assert not os.path.exists(spool.path)
@@ -0,0 +1,60 @@
+import threading
+import sys, os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.gui.log_channel import LogChannel, format_eta, format_progress
+
+
+class TestLogChannel:
+
+    def test_drain_batches_messages(self):
+        ch = LogChannel()
+        ch.log("a")
+        ch.log("b\n")
+        ch.progress({"done": 1, "total": 3})
+        ch.progress({"done": 2, "total": 3})
+        batch = ch.drain()
+        assert batch["text"] == "a\nb\n"
+        assert batch["progress"] == {"done": 2, "total": 3}
+        assert batch["calls"] == [] and batch["closed"] is False
+        assert ch.drain() == {"text": "", "progress": None, "calls": [], "closed": False}
+
+    def test_drain_is_bounded(self):
+        ch = LogChannel()
+        for i in range(5):
+            ch.log(str(i))
+        assert ch.drain(max_items=3)["text"] == "0\n1\n2\n"
+        assert ch.drain()["text"] == "3\n4\n"
+
+    def test_calls_and_close(self):
+        ch = LogChannel()
+        seen = []
+        ch.call(seen.append, "fim")
+        ch.close()
+        batch = ch.drain()
+        for fn, args in batch["calls"]:
+            fn(*args)
+        assert seen == ["fim"] and batch["closed"] is True
+
+    def test_producer_threads(self):
+        ch = LogChannel()
+        threads = [threading.Thread(target=lambda: [ch.log("x") for _ in range(500)])
+                   for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert ch.drain()["text"].count("x\n") == 2000
+
+
+class TestFormatProgress:
+
+    def test_eta(self):
+        assert format_eta(None) == "--:--"
+        assert format_eta(83.4) == "01:23"
+        assert format_eta(3725) == "1:02:05"
+
+    def test_progress_text(self):
+        event = {"done": 12, "total": 340, "elements": 1500, "eta_s": 61}
+        assert format_progress(event) == "12 / 340 códigos · 1500 elementos · ETA 01:01"
@@ -0,0 +1,125 @@
+import pytest
+import sys, os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import ifcopenshell
+import ifcopenshell.api
+
+from app.core.model_cache import ModelIndexCache, ResultCache, file_fingerprint, CACHE_VERSION
+from app.core.structural_engine import IFCInvestigator
+
+
+@pytest.fixture
+def ifc_path(tmp_path):
+    model = ifcopenshell.file(schema="IFC4")
+    ifcopenshell.api.run("root.create_entity", model, ifc_class="IfcProject", name="P")
+    for i in range(3):
+        wall = ifcopenshell.api.run("root.create_entity", model,
+                                    ifc_class="IfcWall", name=f"W{i}",
+                                    predefined_type="SOLIDWALL")
+        pset = ifcopenshell.api.run("pset.add_pset", model, product=wall, name="Pset_WallCommon")
+        ifcopenshell.api.run("pset.edit_pset", model, pset=pset,
+                             properties={"IsExternal": i % 2 == 0})
+    ifcopenshell.api.run("root.create_entity", model, ifc_class="IfcSlab", name="S")
+    path = tmp_path / "m.ifc"
+    model.write(str(path))
+    return path
+
+
+class TestFingerprint:
+
+    def test_changes_with_content(self, tmp_path):
+        p = tmp_path / "a.ifc"
+        p.write_text("ISO-10303-21;A")
+        fp1 = file_fingerprint(p)
+        p.write_text("ISO-10303-21;B")
+        os.utime(p, ns=(fp1["mtime_ns"] + 10**9, fp1["mtime_ns"] + 10**9))
+        assert file_fingerprint(p)["sha"] != fp1["sha"]
+
+
+class TestModelIndexCache:
+
+    FP = {"size": 10, "mtime_ns": 1, "sha": "abc"}
+
+    def test_roundtrip(self, tmp_path):
+        cache = ModelIndexCache(tmp_path)
+        assert cache.save(self.FP, {"classes": {"IfcWall": [1, 2]}})
+        snap = cache.load(self.FP)
+        assert snap["classes"] == {"IfcWall": [1, 2]}
+        assert snap["version"] == CACHE_VERSION
+
+    def test_missing_or_corrupt_entry(self, tmp_path):
+        cache = ModelIndexCache(tmp_path)
+        assert cache.load(self.FP) is None
+        cache.save(self.FP, {})
+        next(tmp_path.glob("*.idx")).write_bytes(b"not a pickle")
+        assert cache.load(self.FP) is None
+
+    def test_clear(self, tmp_path):
+        cache = ModelIndexCache(tmp_path)
+        cache.save(self.FP, {})
+        cache.clear()
+        assert cache.load(self.FP) is None
+
+
+class TestResultCache:
+
+    FP = {"size": 10, "mtime_ns": 1, "sha": "abc"}
+
+    def test_roundtrip_and_clear(self, tmp_path):
+        cache = ResultCache(tmp_path)
+        assert cache.keys(self.FP) == set() and cache.get(self.FP, "k") is None
+        assert cache.put(self.FP, "k", {"found_any": False})
+        assert cache.keys(self.FP) == {"k"}
+        assert cache.get(self.FP, "k") == {"found_any": False}
+        assert cache.get({**self.FP, "sha": "def"}, "k") is None
+        ModelIndexCache(tmp_path).clear()
+        assert cache.get(self.FP, "k")
+        cache.clear()
+        assert cache.keys(self.FP) == set()
+
+    def test_prune_keeps_current_keys(self, tmp_path, monkeypatch):
+        import app.core.model_cache as model_cache
+        cache = ResultCache(tmp_path)
+        cache.put(self.FP, "old", {})
+        monkeypatch.setattr(model_cache, "CACHE_VERSION", CACHE_VERSION + 1)
+        for key in ("a", "b"):
+            cache.put(self.FP, key, {})
+        cache.prune(self.FP, {"a"})
+        assert cache.keys(self.FP) == {"a"}
+        assert [p.name for p in tmp_path.iterdir()] == [f"abc-10-v{CACHE_VERSION + 1}.res"]
+
+
+class TestCachedOpen:
+
+    def test_reopen_restores_index(self, ifc_path, tmp_path):
+        cache = ModelIndexCache(tmp_path / "cache")
+        first = IFCInvestigator(index_cache=cache)
+        first.open_ifc(str(ifc_path), indexed=True)
+        assert not first.index_from_cache
+
+        second = IFCInvestigator(index_cache=cache)
+        second.open_ifc(str(ifc_path), indexed=True)
+        assert second.index_from_cache
+        assert second.list_classes() == first.list_classes()
+        assert second.list_predefined_types("IfcWall") == ["SOLIDWALL"]
+
+        spec = {"ifc_class": "IfcWall",
+                "props": [{"pset": "Pset_WallCommon", "prop": "IsExternal", "value": True}]}
+        assert ([e.GlobalId for e in second._filter_single(spec)] ==
+                [e.GlobalId for e in first._filter_single(spec)])
+        assert len(second._filter_single(spec)) == 2
+
+    def test_plain_open_then_indexed_open_adds_columns(self, ifc_path, tmp_path):
+        cache = ModelIndexCache(tmp_path / "cache")
+        IFCInvestigator(index_cache=cache).open_ifc(str(ifc_path))
+
+        inv = IFCInvestigator(index_cache=cache)
+        inv.open_ifc(str(ifc_path), indexed=True)
+        assert inv.index_from_cache
+        assert "IfcWall" in inv.property_columns
+
+        inv = IFCInvestigator(index_cache=cache)
+        inv.open_ifc(str(ifc_path))
+        assert inv.property_columns is not None
@@ -0,0 +1,128 @@
+import pytest
+import sys, os
+from unittest.mock import MagicMock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.core.model_registry import ModelRegistry
+
+
+def _mock_inv():
+    inv = MagicMock()
+    inv.ifc_file = None
+
+    def _open(path, indexed=False):
+        inv.ifc_file = object()
+    inv.open_ifc.side_effect = _open
+    return inv
+
+
+@pytest.fixture
+def ifc(tmp_path):
+    p = tmp_path / "m.ifc"
+    p.write_text("ISO-10303-21;")
+    return p
+
+
+class TestModelRegistry:
+
+    def test_same_file_is_parsed_once(self, ifc):
+        reg = ModelRegistry(_mock_inv())
+        reg.open(str(ifc))
+        reg.open(str(ifc))
+        assert reg.opens == 1
+        assert reg.is_loaded(str(ifc))
+
+    def test_modified_file_is_reopened(self, ifc):
+        reg = ModelRegistry(_mock_inv())
+        reg.open(str(ifc))
+        st = ifc.stat()
+        os.utime(ifc, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+        assert not reg.is_loaded(str(ifc))
+        reg.open(str(ifc))
+        assert reg.opens == 2
+
+    def test_indexed_reuses_parsed_model(self, ifc):
+        inv = _mock_inv()
+        reg = ModelRegistry(inv)
+        reg.open(str(ifc))
+        reg.open(str(ifc), indexed=True)
+        assert reg.opens == 1
+        inv.build_property_columns.assert_called_once()
+
+    def test_replaced_model_is_reopened(self, ifc):
+        inv = _mock_inv()
+        reg = ModelRegistry(inv)
+        reg.open(str(ifc))
+        inv.ifc_file = object()
+        reg.open(str(ifc))
+        assert reg.opens == 2
+
+    def test_missing_file(self, tmp_path):
+        reg = ModelRegistry(_mock_inv())
+        with pytest.raises(FileNotFoundError):
+            reg.open(str(tmp_path / "nada.ifc"))
+        assert not reg.is_loaded(str(tmp_path / "nada.ifc"))
+
+    def test_using_is_exclusive(self):
+        import threading
+        reg = ModelRegistry(_mock_inv())
+        seen = []
+        with reg.using() as inv:
+            assert inv is reg.inv
+            def other():
+                with reg.using(blocking=False) as busy:
+                    seen.append(busy)
+            t = threading.Thread(target=other)
+            t.start()
+            t.join()
+        assert seen == [None]
+        with reg.using(blocking=False) as inv:
+            assert inv is reg.inv
+
+    def test_build_columns_installs_on_current_model(self, ifc):
+        inv = _mock_inv()
+        inv.property_columns = None
+        inv.index_by_class = {"IfcWall": [], "IfcSlab": []}
+        reg = ModelRegistry(inv)
+        assert not reg.build_columns()
+        reg.open(ifc)
+        assert reg.build_columns()
+        columns = inv.set_property_columns.call_args.args[0]
+        assert "IfcWall" in columns and "IfcSlab" in columns
+
+    def test_build_columns_skips_replaced_model(self, ifc, monkeypatch):
+        import app.core.model_registry as model_registry
+        inv = _mock_inv()
+        inv.property_columns = None
+        inv.index_by_class = {"IfcWall": [], "IfcSlab": []}
+        reg = ModelRegistry(inv)
+        reg.open(ifc)
+
+        def add_class(columns, etype, elems):
+            ifc.write_text("ISO-10303-21;X")
+            reg.open(ifc)
+        monkeypatch.setattr(model_registry.PropertyColumns, "add_class", add_class)
+        assert not reg.build_columns()
+        inv.set_property_columns.assert_not_called()
+
+    def test_indexed_open_finishes_build_in_flight(self, ifc, monkeypatch):
+        import app.core.model_registry as model_registry
+        inv = _mock_inv()
+        inv.property_columns = None
+        inv.index_by_class = {"IfcWall": [], "IfcSlab": [], "IfcDoor": []}
+        reg = ModelRegistry(inv)
+        reg.open(ifc)
+
+        built = []
+        add_class = model_registry.PropertyColumns.add_class
+
+        def add_class_then_open(columns, etype, elems):
+            add_class(columns, etype, elems)
+            built.append(etype)
+            if len(built) == 1:
+                reg.open(ifc, indexed=True)
+        monkeypatch.setattr(model_registry.PropertyColumns, "add_class", add_class_then_open)
+        assert not reg.build_columns()
+        assert built == ["IfcWall", "IfcSlab", "IfcDoor"]
+        inv.set_property_columns.assert_called_once()
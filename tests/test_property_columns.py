@@ -0,0 +1,156 @@
+import pytest
+import sys, os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.core.property_columns import (
+    BoundedMemo,
+    PropertyColumns,
+    bool_from_ifc,
+    normalize_text,
+    predicate_matches,
+    prop_predicate,
+)
+from app.core.structural_engine import IFCInvestigator
+
+
+class FakeEl:
+    def __init__(self, i, predef="SOLIDWALL", objtype=None):
+        self._id = i
+        self.GlobalId = f"G{i}"
+        self.PredefinedType = predef
+        self.ObjectType = objtype
+
+    def id(self):
+        return self._id
+
+
+PSETS = {
+    1: {"Pset_WallCommon": {"IsExternal": ".T.", "Ref": "A"},
+        "Qto_WallBaseQuantities": {"NetVolume": 1.5}},
+    2: {"Pset_WallCommon": {"IsExternal": False, "Ref": "b"},
+        "Qto_WallBaseQuantities": {"NetVolume": "2.5"}},
+    3: {"Pset_WallCommon": {"IsExternal": True, "Ref": "a"}},
+}
+
+
+def _fake_psets(e):
+    return PSETS.get(e.id(), {})
+
+
+def _columns():
+    elems = [FakeEl(1), FakeEl(2), FakeEl(3, predef="USERDEFINED", objtype="Muro")]
+    return elems, PropertyColumns.build({"IfcWall": elems}, get_psets=_fake_psets)
+
+
+class TestNormalization:
+
+    @pytest.mark.parametrize("raw,expected", [
+        (True, True), (".T.", True), ("yes", True), ("0", False),
+        (".F.", False), (None, None), ("maybe", None),
+    ])
+    def test_bool_from_ifc(self, raw, expected):
+        assert bool_from_ifc(raw) is expected
+
+    def test_normalize_text_folds_booleans(self):
+        assert normalize_text(" .T. ") == "true"
+        assert normalize_text("Concrete") == "concrete"
+
+
+class TestPropPredicate:
+
+    def test_values_are_normalized_once(self):
+        assert prop_predicate({"pset": "P", "prop": "X", "value": " .T. "}) == ("text", "P", "X", "true")
+        assert prop_predicate({"pset": "P", "prop": "X", "value": 2}) == ("num", "P", "X", 2.0)
+        assert prop_predicate({"pset": "P", "prop": "X", "value": True}) == ("bool", "P", "X", True)
+        assert prop_predicate({"pset": "P", "prop": "", "value": 1}) is None
+
+    @pytest.mark.parametrize("value,cur,expected", [
+        (True, ".T.", True), (True, None, False), (2, "2.0", True),
+        (2, "abc", False), ("Muro", " muro ", True), ("x", None, False),
+    ])
+    def test_matches(self, value, cur, expected):
+        pred = prop_predicate({"pset": "P", "prop": "X", "value": value})
+        assert predicate_matches(pred, cur) is expected
+
+
+class TestPropertyColumns:
+
+    def test_bool_mask(self):
+        _, cols = _columns()
+        m = cols.mask("IfcWall", extras=[
+            {"pset": "Pset_WallCommon", "prop": "IsExternal", "value": True}])
+        assert m.tolist() == [True, False, True]
+
+    def test_text_mask_is_case_insensitive(self):
+        _, cols = _columns()
+        m = cols.mask("IfcWall", extras=[
+            {"pset": "Pset_WallCommon", "prop": "Ref", "value": "a"}])
+        assert m.tolist() == [True, False, True]
+
+    def test_numeric_mask(self):
+        _, cols = _columns()
+        m = cols.mask("IfcWall", extras=[
+            {"pset": "Qto_WallBaseQuantities", "prop": "NetVolume", "value": 2.5}])
+        assert m.tolist() == [False, True, False]
+
+    def test_predefined_and_object_type(self):
+        _, cols = _columns()
+        assert cols.mask("IfcWall", predef="SOLIDWALL").tolist() == [True, True, False]
+        assert cols.mask("IfcWall", predef="USERDEFINED", objtype="muro").tolist() == [False, False, True]
+
+    def test_missing_property_never_matches_bool(self):
+        _, cols = _columns()
+        m = cols.mask("IfcWall", extras=[
+            {"pset": "Pset_Missing", "prop": "X", "value": False}])
+        assert not m.any()
+
+    def test_only_existing_columns_are_derived_once(self):
+        _, cols = _columns()
+        for prop in ("R", "Re", "Ref"):
+            cols.mask("IfcWall", extras=[{"pset": "Pset_WallCommon", "prop": prop, "value": "a"}])
+        assert list(cols._derived) == [("text", "IfcWall", "Pset_WallCommon", "Ref")]
+        cols.clear_derived()
+        assert not cols._derived
+
+
+class TestBoundedMemo:
+
+    def test_evicts_least_recently_used(self):
+        memo = BoundedMemo(2)
+        memo["a"] = 1
+        memo["b"] = 2
+        assert memo.get("a") == 1
+        memo["c"] = 3
+        assert list(memo) == ["a", "c"]
+        assert memo.get("b") is None
+
+
+class TestIndexedInvestigator:
+
+    def _inv(self, monkeypatch):
+        import ifcopenshell.util.element as util_el
+        monkeypatch.setattr(util_el, "get_psets", _fake_psets)
+        elems, cols = _columns()
+        inv = IFCInvestigator()
+        inv.ifc_file = object()
+        inv.index_by_class = {"IfcWall": elems}
+        return inv, cols
+
+    def test_indexed_filter_matches_python_path(self, monkeypatch):
+        inv, cols = self._inv(monkeypatch)
+        spec = {"ifc_class": "IfcWall", "predefined": "SOLIDWALL",
+                "props": [{"pset": "Pset_WallCommon", "prop": "Ref", "value": "A"}]}
+        plain = inv._filter_single(spec)
+        inv.property_columns = cols
+        indexed = inv._filter_single(spec)
+        assert [e.id() for e in plain] == [e.id() for e in indexed] == [1]
+
+    def test_indexed_sum_matches_python_path(self, monkeypatch):
+        inv, cols = self._inv(monkeypatch)
+        elems = inv.index_by_class["IfcWall"]
+        plain_total, plain_det = inv.sum_quantity(elems, "Qto_WallBaseQuantities", "NetVolume")
+        inv.property_columns = cols
+        total, det = inv.sum_quantity(elems, "Qto_WallBaseQuantities", "NetVolume")
+        assert total == plain_total == 4.0
+        assert [d["guid"] for d in det] == [d["guid"] for d in plain_det] == ["G1", "G2"]
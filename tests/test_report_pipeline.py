@@ -0,0 +1,307 @@
+import json
+import pytest
+import sys, os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from unittest.mock import MagicMock
+
+from app.core.report_pipeline import (
+    parse_wbs_code,
+    unique_output_path,
+    evaluate_rule,
+    evaluate_rules,
+    evaluate_rules_cached,
+    export_elements_csv,
+    export_elements_parquet,
+    CSV_HEADERS,
+)
+from app.core.detail_spool import DetailSpool
+from app.core.model_cache import ResultCache, file_fingerprint
+from app.core.structural_engine import rule_key
+
+
+class TestParseWbsCode:
+
+    def test_numeric_parts(self):
+        assert parse_wbs_code("08.01.10") == (8, 1, 10)
+
+    def test_numeric_order(self):
+        codes = ["08.10", "08.2", "08.01"]
+        assert sorted(codes, key=parse_wbs_code) == ["08.01", "08.2", "08.10"]
+
+    def test_empty_goes_last(self):
+        assert parse_wbs_code("") > parse_wbs_code("99")
+
+
+class TestUniqueOutputPath:
+
+    def test_free_name(self, tmp_path):
+        assert unique_output_path(tmp_path, "Mapa", ".xlsx").name == "Mapa.xlsx"
+
+    def test_existing_name_gets_counter(self, tmp_path):
+        (tmp_path / "Mapa.xlsx").write_text("")
+        (tmp_path / "Mapa(1).xlsx").write_text("")
+        assert unique_output_path(tmp_path, "Mapa", ".xlsx").name == "Mapa(2).xlsx"
+
+
+def _mock_inv(details, psets=None):
+    inv = MagicMock()
+    inv.extract_quantities.return_value = (sum(d["valor"] for d in details), details, bool(details))
+    inv.get_psets.side_effect = lambda e: (psets or {}).get(e.GlobalId, {})
+    inv.get_element_material.return_value = "Betão"
+    inv.get_classification_code.return_value = "n/a"
+    inv.get_building_storey.return_value = "Piso 0"
+    return inv
+
+
+def _element(guid):
+    e = MagicMock()
+    e.GlobalId = guid
+    e.is_a.return_value = "IfcWall"
+    e.PredefinedType = "SOLIDWALL"
+    e.ObjectType = None
+    return e
+
+
+class TestEvaluateRule:
+
+    RULE = {"mappings": [{"filter": {"ifc_class": "IfcWall"}}],
+            "quantity": {"type": "prop"},
+            "agrupamento": {"pset": "Pset_X", "prop": "Zona"}}
+
+    def test_records_are_plain_values(self):
+        details = [{"guid": "A", "valor": 1.5, "element": _element("A")}]
+        res = evaluate_rule(_mock_inv(details), self.RULE)
+        assert res["found_any"] is True
+        assert res["records"] == [{
+            "guid": "A", "value": 1.5, "ifc_class": "IfcWall",
+            "predefined": "SOLIDWALL", "objecttype": "n/a",
+            "material": "Betão", "classification_code": "n/a",
+            "buildingstorey": "Piso 0", "group_value": None,
+        }]
+
+    def test_unset_predefined_type_is_notdefined(self):
+        e = _element("A")
+        e.PredefinedType = None
+        res = evaluate_rule(_mock_inv([{"guid": "A", "valor": 1.0, "element": e}]), self.RULE)
+        assert res["records"][0]["predefined"] == "NOTDEFINED"
+
+    def test_grouping_keeps_first_seen_order(self):
+        details = [{"guid": g, "valor": v, "element": _element(g)}
+                   for g, v in (("A", 1.0), ("B", 2.0), ("C", 3.0))]
+        psets = {"A": {"Pset_X": {"Zona": "Z2"}},
+                 "B": {"Pset_X": {"Zona": " Z1 "}},
+                 "C": {"Pset_X": {"Zona": "Z2"}}}
+        res = evaluate_rule(_mock_inv(details, psets), self.RULE)
+        assert res["group_values"] == ["Z2", "Z1"]
+        assert res["group_sums"] == {"Z2": 4.0, "Z1": 2.0}
+
+    def test_not_found(self):
+        res = evaluate_rule(_mock_inv([]), self.RULE)
+        assert res["found_any"] is False
+        assert res["records"] == []
+
+    def test_stats_are_counter_deltas(self):
+        details = [{"guid": "A", "valor": 1.5, "element": _element("A")}]
+        inv = _mock_inv(details)
+        inv.engine_counters.side_effect = [
+            {"elements_scanned": 10, "pset_calls": 4, "pset_cache_hits": 1, "filter_memo_hits": 0},
+            {"elements_scanned": 25, "pset_calls": 7, "pset_cache_hits": 3, "filter_memo_hits": 1},
+        ]
+        stats = evaluate_rule(inv, self.RULE)["stats"]
+        assert {k: stats[k] for k in ("elements_scanned", "pset_calls",
+                                      "pset_cache_hits", "filter_memo_hits")} == {
+            "elements_scanned": 15, "pset_calls": 3, "pset_cache_hits": 2, "filter_memo_hits": 1,
+        }
+        assert stats["extract_s"] >= 0 and stats["details_s"] >= 0
+
+    def test_error_is_captured(self):
+        inv = MagicMock()
+        inv.extract_quantities.side_effect = RuntimeError("falhou")
+        assert evaluate_rule(inv, self.RULE)["error"] == "falhou"
+
+
+class TestEvaluateRules:
+
+    def test_serial_order_follows_wbs_codes(self):
+        inv = _mock_inv([])
+        rules = {c: TestEvaluateRule.RULE for c in ("08.10", "08.2", "01.01")}
+        codes = [c for c, _ in evaluate_rules(inv, rules, ifc_path="m.ifc", workers=8)]
+        assert codes == ["01.01", "08.2", "08.10"]
+
+    def test_result_cache_evaluates_only_changed_rules(self, tmp_path):
+        ifc = tmp_path / "m.ifc"
+        ifc.write_text("ISO-10303-21;")
+        cache = ResultCache(tmp_path / "cache")
+        count = {"mappings": [{"filter": {"ifc_class": "IfcDoor"}}], "quantity": {"type": "count"}}
+        rules = {c: TestEvaluateRule.RULE for c in ("08.10", "08.2", "01.01")}
+
+        def run(rules):
+            inv, logs = _mock_inv([]), []
+            out = list(evaluate_rules_cached(inv, rules, ifc_path=str(ifc),
+                                             result_cache=cache, log=logs.append))
+            return [c for c, _ in out], inv.extract_quantities.call_count, logs[0]
+
+        assert run(rules) == (["01.01", "08.2", "08.10"], 3,
+                              "Cache de resultados: 0 regra(s) reutilizada(s), 3 a avaliar")
+        rules["08.2"] = count
+        assert run(rules) == (["01.01", "08.2", "08.10"], 1,
+                              "Cache de resultados: 2 regra(s) reutilizada(s), 1 a avaliar")
+        ifc.write_text("ISO-10303-21;X")
+        assert run(rules)[1] == 3
+        fp = file_fingerprint(ifc)
+        assert len(cache.keys(fp)) == 2
+        assert all("stats" not in cache.get(fp, k) for k in cache.keys(fp))
+
+    def test_result_cache_keeps_results_of_an_early_stop(self, tmp_path):
+        ifc = tmp_path / "m.ifc"
+        ifc.write_text("ISO-10303-21;")
+        cache = ResultCache(tmp_path / "cache")
+        rules = {f"01.0{i}": {"mappings": [{"filter": {"ifc_class": f"IfcWall{i}"}}],
+                              "quantity": {"type": "count"}} for i in range(1, 4)}
+        gen = evaluate_rules_cached(_mock_inv([]), rules, ifc_path=str(ifc),
+                                    result_cache=cache, log=lambda m: None)
+        next(gen)
+        gen.close()
+        assert len(cache.keys(file_fingerprint(ifc))) == 1
+
+    def test_unreadable_cache_entry_is_evaluated(self, tmp_path):
+        ifc = tmp_path / "m.ifc"
+        ifc.write_text("ISO-10303-21;")
+        cache = ResultCache(tmp_path / "cache")
+        rules = {"01.01": TestEvaluateRule.RULE}
+        list(evaluate_rules_cached(_mock_inv([]), rules, ifc_path=str(ifc),
+                                   result_cache=cache, log=lambda m: None))
+        for entry in (tmp_path / "cache").rglob("*.pkl"):
+            entry.write_bytes(b"not a pickle")
+        inv = _mock_inv([])
+        out = list(evaluate_rules_cached(inv, rules, ifc_path=str(ifc),
+                                         result_cache=cache, log=lambda m: None))
+        assert [c for c, _ in out] == ["01.01"] and inv.extract_quantities.call_count == 1
+        assert cache.get(file_fingerprint(ifc), rule_key(TestEvaluateRule.RULE)) is not None
+
+
+class TestExportElementsCsv:
+
+    def _cache(self, tmp_path):
+        spool = DetailSpool(tmp_path)
+        rec = lambda g, grp: {"guid": g, "value": 1.0, "group_value": grp}
+        spool.write("08.01.01", [rec("A", "Z2"), rec("B", None), rec("C", "Z1")], "prop")
+        spool.write("08.02.01", [rec("D", None)], "count")
+        return {
+            "headers": list(CSV_HEADERS),
+            "wbs_rows": [{"wbs_codigo": c, "descricao": c.replace(".", "-")}
+                         for c in ("08", "08.01", "08.01.01", "08.02", "08.02.01", "09")],
+            "meta": {"ifc_project": "P", "ifc_site": "S", "ifc_building": "B"},
+            "found_codes": ["08.01.01", "08.02.01"],
+            "spool": spool,
+            "code_to_unit": {"08.01.01": "m3"},
+        }
+
+    def _read(self, path):
+        import csv
+        with open(path, encoding="utf-8-sig", newline="") as f:
+            return list(csv.DictReader(f))
+
+    def test_rows_follow_wbs_order(self, tmp_path):
+        code_ext = {"08.01.01": {"desc": "08.01.01.01",
+                                 "groups": {"Z2": "08.01.01.01.01", "Z1": "08.01.01.01.02"}}}
+        out = export_elements_csv(self._cache(tmp_path), code_ext, tmp_path, "m")
+        rows = self._read(out)
+        assert [(r["wbs_codigo"], r["ifc_guid"]) for r in rows] == [
+            ("08", ""), ("08.01", ""),
+            ("08.01.01.01", ""),
+            ("08.01.01.01.01", "A"), ("08.01.01.01.02", "C"), ("08.01.01.01.03", "B"),
+            ("08.02", ""),
+            ("08.02.01.01", ""), ("08.02.01.01.01", "D"),
+        ]
+        assert rows[2]["descricao"] == "08-01-01"
+        assert rows[5]["descricao"] == "n/a"
+        assert rows[3]["unidade"] == "m3"
+        assert rows[8]["qty_type"] == "count"
+        assert rows[8]["ifc_project"] == "P"
+
+
+class TestExportElementsParquet:
+
+    def test_typed_columns_and_chapter_row_groups(self, tmp_path):
+        pq = pytest.importorskip("pyarrow.parquet")
+        cache = TestExportElementsCsv()._cache(tmp_path)
+        cache["wbs_rows"].append({"wbs_codigo": "09.01", "descricao": "x"})
+        cache["spool"].write("09.01", [{"guid": "E", "value": 2.0, "ifc_class": "IfcSlab"}], "prop")
+        cache["found_codes"].append("09.01")
+        out = export_elements_parquet(cache, {}, tmp_path, "m")
+
+        f = pq.ParquetFile(out)
+        assert f.metadata.num_row_groups == 2
+        table = f.read()
+        assert table.column_names == [h for h in CSV_HEADERS if h != "wbs_group"]
+        assert str(table.schema.field("ifc_valor").type) == "double"
+        assert str(table.schema.field("ifc_class").type).startswith("dictionary")
+        csv_rows = TestExportElementsCsv()._read(export_elements_csv(cache, {}, tmp_path, "m"))
+        assert table.column("ifc_guid").to_pylist() == [r["ifc_guid"] for r in csv_rows]
+        assert table.column("ifc_valor").to_pylist()[-1] == 2.0
+
+    def test_requires_pyarrow(self, tmp_path, monkeypatch):
+        monkeypatch.setitem(sys.modules, "pyarrow", None)
+        with pytest.raises(RuntimeError, match="pyarrow"):
+            export_elements_parquet(TestExportElementsCsv()._cache(tmp_path), {}, tmp_path, "m")
+
+
+class TestGenerateReport:
+
+    COLS = {"col_wbs": "WBS", "col_desc": "Descrição", "col_nivel": "Nível",
+            "col_unidades": "Unid."}
+
+    def _wbs(self):
+        import pandas as pd
+        return pd.DataFrame([
+            ("08",       1,  "Cap",        None),
+            ("08.01",    2,  "Paredes",    None),
+            (None,       10, "Parede ext", "m2"),
+            ("08.02",    2,  "Lajes",      None),
+            (None,       10, "Laje",       "m3"),
+            ("09",       1,  "Outro",      None),
+            ("09.01",    2,  "Sem desc",   None),
+        ], columns=["WBS", "Nível", "Descrição", "Unid."])
+
+    def test_found_and_full_tables(self, tmp_path, monkeypatch):
+        import pandas as pd
+        from app.core import report_pipeline
+        results = {
+            "08.01": {"found_any": True, "total": 5.0, "records": [],
+                      "group_values": ["Z1", "Z2"], "group_sums": {"Z1": 2.0, "Z2": 3.0}},
+            "08.02": {"found_any": False},
+            "09.01": {"found_any": False},
+        }
+        monkeypatch.setattr(report_pipeline, "evaluate_rules",
+                            lambda inv, rules, ifc_path, workers, **kw: iter(results.items()))
+        inv = MagicMock()
+        inv.get_project_info.return_value = {}
+        events = []
+        res = report_pipeline.generate_report(inv, {c: {} for c in results}, self._wbs(),
+                                              self.COLS, "m.ifc", tmp_path, log=lambda *a: None,
+                                              progress=events.append)
+        assert [(e["done"], e["total"]) for e in events] == [(0, 3), (1, 3), (2, 3), (3, 3)]
+        assert events[0]["eta_s"] is None and events[-1]["eta_s"] == 0.0
+
+        found = pd.read_excel(res["mqt_path"], dtype=str)
+        assert found["WBS"].tolist() == ["08", "08.01", "08.01.01", "08.01.01.01", "08.01.01.02"]
+        assert found["QDTE."].tolist()[3:] == ["2", "3"]
+
+        full = pd.read_excel(res["verified_path"], dtype=str)
+        assert full["WBS"].tolist() == [
+            "08", "08.01", "08.01.01", "08.01.01.01", "08.01.01.02",
+            "08.02", "08.02.01", "09", "09.01", "09.01.01",
+        ]
+        assert full["QUANTIDADE"].tolist()[6] == report_pipeline.NOT_FOUND_TEXT
+        assert full["QUANTIDADE"].tolist()[9] == report_pipeline.NOT_FOUND_TEXT
+        assert res["code_extensions"]["08.01"]["groups"] == {"Z1": "08.01.01.01", "Z2": "08.01.01.02"}
+        assert res["code_extensions"]["09.01"] == {"desc": "09.01.01", "groups": {}}
+
+        report = json.loads(res["run_report_path"].read_text(encoding="utf-8"))
+        assert res["run_report_path"].name == "RelatorioExecucao_m.json"
+        assert report["counters"]["rows_verified"] == 10
+        assert {"compile_rules", "evaluate", "xlsx_mqt", "xlsx_verified"} <= report["spans"].keys()
+        res["csv_cache"]["spool"].discard()
@@ -0,0 +1,116 @@
+import csv
+import pytest
+import sys, os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import ifcopenshell
+import ifcopenshell.api as api
+from openpyxl import load_workbook
+
+from app.core.model_cache import ResultCache
+from app.core.revision_diff import ADDED, CHANGED, REMOVED, diff_revisions, diff_rule, generate_diff
+
+
+def _res(*records, qty_type="prop"):
+    recs = [{"guid": g, "value": v, "ifc_class": "IfcWall"} for g, v in records]
+    return {"found_any": bool(recs), "qty_type": qty_type,
+            "total": sum(v for _, v in records), "records": recs}
+
+
+class TestDiffRule:
+
+    def test_added_removed_changed(self):
+        d = diff_rule(_res(("A", 1.0), ("B", 2.0), ("C", 3.0)),
+                      _res(("B", 2.0), ("C", 4.5), ("D", 1.0)))
+        assert d["elements"] == [
+            ("D", ADDED, "IfcWall", None, 1.0),
+            ("A", REMOVED, "IfcWall", 1.0, None),
+            ("C", CHANGED, "IfcWall", 3.0, 4.5),
+        ]
+        assert (d["old_total"], d["new_total"], d["delta"]) == (6.0, 7.5, 1.5)
+        assert d["counts"] == {ADDED: 1, REMOVED: 1, CHANGED: 1}
+
+    def test_repeated_guid_is_summed(self):
+        d = diff_rule(_res(("A", 1.0), ("A", 1.0)), _res(("A", 2.0)))
+        assert d["elements"] == []
+
+    def test_not_found_and_errors(self):
+        diffs, errors = diff_revisions(
+            {"08.2": {"found_any": False, "qty_type": "count"}, "08.10": {"error": "x"}},
+            {"08.2": _res(("A", 1.0), qty_type="count"), "08.10": _res()},
+        )
+        assert list(diffs) == ["08.2"]
+        assert diffs["08.2"]["delta"] == 1.0
+        assert errors == {"08.10": "x"}
+
+
+class TestGenerateDiff:
+
+    @staticmethod
+    def _model(path, doors, volumes):
+        f = ifcopenshell.file(schema="IFC4")
+        api.run("root.create_entity", f, ifc_class="IfcProject", name="P")
+        for guid in doors:
+            door = api.run("root.create_entity", f, ifc_class="IfcDoor", predefined_type="DOOR")
+            door.GlobalId = guid
+        for guid, volume in volumes.items():
+            wall = api.run("root.create_entity", f, ifc_class="IfcWall", predefined_type="SOLIDWALL")
+            wall.GlobalId = guid
+            qto = api.run("pset.add_qto", f, product=wall, name="Qto_WallBaseQuantities")
+            api.run("pset.edit_qto", f, qto=qto, properties={"NetVolume": volume})
+        f.write(str(path))
+        return str(path)
+
+    RULES = {
+        "08.01": {"mappings": [{"filter": {"ifc_class": "IfcDoor", "predefined": "DOOR"}}],
+                  "quantity": {"type": "count"}},
+        "08.02": {"mappings": [{"filter": {"ifc_class": "IfcWall", "predefined": "SOLIDWALL"},
+                                "quantity_detail": {"pset": "Qto_WallBaseQuantities",
+                                                    "prop": "NetVolume"}}],
+                  "quantity": {"type": "prop"}},
+    }
+
+    def test_cached_revisions_are_not_opened(self, tmp_path, monkeypatch):
+        from app.core.structural_engine import IFCInvestigator
+        old = self._model(tmp_path / "r1.ifc", ["A"], {})
+        new = self._model(tmp_path / "r2.ifc", ["A", "B"], {})
+        cache = ResultCache(tmp_path / "cache")
+        opened = []
+        open_ifc = IFCInvestigator.open_ifc
+        monkeypatch.setattr(IFCInvestigator, "open_ifc",
+                            lambda inv, path, **kw: opened.append(path) or open_ifc(inv, path, **kw))
+
+        first = generate_diff(self.RULES, old, new, tmp_path / "out", log=lambda m: None,
+                              result_cache=cache)
+        assert opened == [old, new]
+        second = generate_diff(self.RULES, old, new, tmp_path / "out", log=lambda m: None,
+                               result_cache=cache)
+        assert opened == [old, new]
+        assert second["changed_codes"] == first["changed_codes"] == ["08.01"]
+
+    def test_end_to_end(self, tmp_path):
+        g = [ifcopenshell.guid.new() for _ in range(4)]
+        old = self._model(tmp_path / "r1.ifc", [g[0]], {g[1]: 2.0, g[2]: 3.0})
+        new = self._model(tmp_path / "r2.ifc", [g[0], g[3]], {g[1]: 2.5})
+        rules = {
+            "08.01": {"mappings": [{"filter": {"ifc_class": "IfcDoor", "predefined": "DOOR"}}],
+                      "quantity": {"type": "count"}},
+            "08.02": {"mappings": [{"filter": {"ifc_class": "IfcWall", "predefined": "SOLIDWALL"},
+                                    "quantity_detail": {"pset": "Qto_WallBaseQuantities",
+                                                        "prop": "NetVolume"}}],
+                      "quantity": {"type": "prop"}},
+        }
+        out = generate_diff(rules, old, new, tmp_path / "out", log=lambda m: None)
+
+        assert out["changed_codes"] == ["08.01", "08.02"]
+        assert out["diffs"]["08.02"]["delta"] == pytest.approx(-2.5)
+
+        ws = load_workbook(out["xlsx_path"]).active
+        rows = list(ws.iter_rows(values_only=True))
+        assert rows[0][:4] == ("WBS", "QDTE. ANTERIOR", "QDTE. NOVA", "DIFERENÇA")
+        assert rows[1] == ("08.01", 1, 2, 1, 1, 0, 0)
+
+        with open(out["csv_path"], encoding="utf-8-sig") as f:
+            states = [(r["wbs_codigo"], r["ifc_guid"], r["estado"]) for r in csv.DictReader(f)]
+        assert states == [("08.01", g[3], ADDED), ("08.02", g[2], REMOVED), ("08.02", g[1], CHANGED)]
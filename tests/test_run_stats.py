@@ -0,0 +1,47 @@
+import json
+import sys, os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.core.run_stats import RunStats
+
+
+def _result(seconds, elements, scanned=0):
+    return {"records": [{}] * elements,
+            "stats": {"extract_s": seconds, "details_s": 0.0, "elements_scanned": scanned,
+                      "pset_calls": 2, "pset_cache_hits": 1, "filter_memo_hits": 0}}
+
+
+class TestRunStats:
+
+    def test_spans_accumulate(self):
+        stats = RunStats()
+        with stats.span("xlsx_mqt"):
+            pass
+        stats.add_time("xlsx_mqt", 1.0)
+        seconds, calls = stats.spans["xlsx_mqt"]
+        assert seconds >= 1.0 and calls == 2
+
+    def test_rules_aggregate_per_run_and_per_code(self):
+        stats = RunStats()
+        stats.record_rule("08.01", _result(0.5, 3, scanned=100))
+        stats.record_rule("08.02", _result(2.0, 1, scanned=40))
+        stats.record_rule("08.03", {"records": []})
+        assert stats.counters == {"rules_evaluated": 2, "rules_cached": 1,
+                                  "elements_scanned": 140, "pset_calls": 4,
+                                  "pset_cache_hits": 2, "filter_memo_hits": 0}
+        assert stats.spans["rule_extract"] == [2.5, 2]
+        assert stats.codes["08.01"]["elements"] == 3
+        assert [c for c, _ in stats.slowest_codes()] == ["08.02", "08.01"]
+
+    def test_summary_and_json(self, tmp_path):
+        stats = RunStats()
+        stats.record_rule("08.01", _result(0.5, 3))
+        stats.add_time("evaluate", 0.6)
+        lines = stats.summary_lines()
+        assert lines[0].startswith("\nTempos da execução")
+        assert any(line.strip().startswith("08.01") for line in lines)
+
+        data = json.loads(stats.write_json(tmp_path / "run.json").read_text(encoding="utf-8"))
+        assert data["spans"]["evaluate"] == {"seconds": 0.6, "calls": 1}
+        assert data["codes"]["08.01"]["elements"] == 3
@@ -8,6 +8,10 @@ from app.core.structural_engine import (
     load_and_migrate_rules,
     IFCInvestigator,
     NO_ELEMENTS_FOUND,
+    RuleCompileError,
+    compile_rule,
+    compile_rules,
+    rule_key,
 )
 
 
@@ -283,3 +287,436 @@ class TestExtractQuantities:
         total, details, found_any = inv.extract_quantities(v1_rule)
         assert found_any is True
         assert abs(total - 2.0) < 1e-9
+
+
+class TestCompileRule:
+
+    RULE = {
+        "mappings": [{
+            "filter": {"ifc_class": "IfcWall", "predefined": "USERDEFINED",
+                       "object_type": "muro", "props": [
+                           {"pset": "Pset_WallCommon", "prop": "IsExternal", "value": True},
+                           {"pset": "Pset_WallCommon", "prop": "", "value": "x"},
+                       ]},
+            "quantity_detail": {"pset": "Qto", "prop": "NetVolume"},
+        }],
+        "material": {"category": " Betão ", "name": ""},
+        "quantity": {"type": "prop"},
+        "agrupamento": {"pset": "Pset_X", "prop": "Zona"},
+    }
+
+    def test_plan_is_normalized(self):
+        plan = compile_rule(self.RULE)
+        m = plan.mappings[0]
+        assert m.filter.object_type == "MURO"
+        assert m.filter.props == (("bool", "Pset_WallCommon", "IsExternal", True),)
+        assert (m.q_pset, m.q_prop) == ("Qto", "NetVolume")
+        assert plan.material == ("betão", "")
+        assert (plan.group_pset, plan.group_prop) == ("Pset_X", "Zona")
+        assert compile_rule(plan) is plan
+        with pytest.raises(AttributeError):
+            plan.qty_type = "count"
+
+    def test_v1_rule(self):
+        plan = compile_rule({"filter": {"ifc_class": "IfcSlab"},
+                             "quantity": {"pset": "Qto", "prop": "NetArea"}})
+        assert plan.mappings[0].filter.ifc_class == "IfcSlab"
+        assert plan.mappings[0].q_prop == "NetArea"
+        assert plan.material is None
+
+    @pytest.mark.parametrize("rule,message", [
+        ({"mappings": [], "quantity": {"type": "area"}}, "Tipo de quantificação"),
+        ({"mappings": [{"filter": []}]}, "Mapeamento 1"),
+        ({"mappings": [{"filter": {"ifc_class": "IfcWall",
+                                   "props": [{"pset": "P", "prop": "X", "value": [1]}]}}]},
+         "valor inválido"),
+    ])
+    def test_invalid_rules(self, rule, message):
+        with pytest.raises(RuleCompileError, match=message):
+            compile_rule(rule)
+
+    def test_rule_key_is_canonical(self):
+        v1 = {"filter": {"ifc_class": "IfcSlab"}, "quantity": {"pset": "Qto", "prop": "NetArea"}}
+        v2 = migrate_rule_v1_to_v2(v1)
+        assert rule_key(v1) == rule_key(v2) == rule_key(compile_rule(v2))
+        assert rule_key(self.RULE) != rule_key({**self.RULE, "material": "Aço"})
+
+    def test_compile_rules_collects_errors(self):
+        plans, errors = compile_rules({"01": self.RULE, "02": {"mappings": "x"}})
+        assert list(plans) == ["01"]
+        assert "02" in errors
+
+
+class TestSharedFilters:
+
+    class Wall:
+        def __init__(self, i, ref):
+            self._id = i
+            self.GlobalId = f"G{i}"
+            self.PredefinedType = "SOLIDWALL"
+            self.ref = ref
+
+        def id(self):
+            return self._id
+
+    def _inv(self, monkeypatch):
+        import ifcopenshell.util.element as util_el
+        monkeypatch.setattr(util_el, "get_psets",
+                            lambda e: {"Pset_WallCommon": {"Reference": e.ref}})
+        inv = IFCInvestigator()
+        inv.ifc_file = object()
+        inv.index_by_class = {"IfcWall": [self.Wall(i, f"R{i % 2}") for i in range(4)]}
+        return inv
+
+    def _spec(self, ref):
+        return {"ifc_class": "IfcWall", "predefined": "SOLIDWALL",
+                "props": [{"pset": "Pset_WallCommon", "prop": "Reference", "value": ref}]}
+
+    @pytest.mark.parametrize("indexed", [False, True])
+    def test_prefix_and_filters_are_shared(self, monkeypatch, indexed):
+        inv = self._inv(monkeypatch)
+        if indexed:
+            inv.build_property_columns()
+        a = inv._filter_single(self._spec("R0"))
+        b = inv._filter_single(self._spec("R1"))
+        again = inv._filter_single(self._spec("r0 "))
+        assert [e.GlobalId for e in a] == ["G0", "G2"]
+        assert [e.GlobalId for e in b] == ["G1", "G3"]
+        assert again == a and again is not a
+        stats = inv.filter_memo_stats()
+        assert (stats["prefixes"], stats["filters"], stats["hits"]) == (1, 2, 1)
+        assert stats["value_index"] == (0 if indexed else 1)
+
+    def test_value_index(self, monkeypatch):
+        inv = self._inv(monkeypatch)
+        index = inv.value_index("IfcWall", "Pset_WallCommon", "Reference")
+        assert index == {"r0": frozenset({0, 2}), "r1": frozenset({1, 3})}
+        assert inv.value_index("IfcWall", "Pset_WallCommon", "Reference") is index
+        assert inv.value_index("IfcWall", "Pset_WallCommon", "Nada") == {"none": frozenset(range(4))}
+        assert inv.value_index("IfcWall", "Pset_WallCommon", "Nada", "bool") == {}
+        assert inv.filter_memo_stats()["value_index"] == 1
+
+    def test_filter_memo_is_bounded(self, monkeypatch):
+        import app.core.structural_engine as engine
+        monkeypatch.setattr(engine, "FILTER_MEMO_SIZE", 3)
+        inv = self._inv(monkeypatch)
+        for k in range(10):
+            inv._filter_single(self._spec(f"R{k}"))
+        assert inv.filter_memo_stats()["filters"] == 3
+
+    def test_preview_rule(self, monkeypatch):
+        inv = self._inv(monkeypatch)
+        rule = {"mappings": [{"filter": self._spec("R0")},
+                             {"filter": self._spec("R1"),
+                              "quantity_detail": {"pset": "Pset_WallCommon", "prop": "Reference"}}],
+                "quantity": {"type": "prop"}}
+        preview = inv.preview_rule(rule)
+        assert preview["blocks"] == [{"count": 2, "total": None}, {"count": 2, "total": 0.0}]
+        assert (preview["count"], preview["total"]) == (4, 0.0)
+
+        rule["quantity"]["type"] = "count"
+        assert inv.preview_rule(rule)["total"] == 4
+        assert inv.preview_rule(rule, cancelled=lambda: True) is None
+        assert inv.filter_memo_stats()["hits"] >= 2
+
+    def test_engine_counters(self, monkeypatch):
+        inv = self._inv(monkeypatch)
+        inv._filter_single(self._spec("R0"))
+        inv._filter_single(self._spec("R0"))
+        assert inv.engine_counters() == {
+            "elements_scanned": 4, "pset_calls": 4,
+            "pset_cache_hits": 0, "filter_memo_hits": 1,
+        }
+
+    def test_memo_follows_the_model(self, monkeypatch):
+        inv = self._inv(monkeypatch)
+        inv._filter_single(self._spec("R0"))
+        inv.ifc_file = object()
+        inv.index_by_class = {"IfcWall": [self.Wall(9, "R0")]}
+        assert [e.GlobalId for e in inv._filter_single(self._spec("R0"))] == ["G9"]
+        assert inv.filter_memo_stats()["hits"] == 0
+
+
+class TestPsetCache:
+
+    class FakeEl:
+        def __init__(self, i):
+            self._id = i
+            self.GlobalId = f"G{i}"
+
+        def id(self):
+            return self._id
+
+    def test_second_lookup_is_a_hit(self, monkeypatch):
+        import ifcopenshell.util.element as util_el
+
+        calls = []
+        def fake_psets(e):
+            calls.append(e)
+            return {"Qto": {"NetVolume": 1.0}}
+        monkeypatch.setattr(util_el, "get_psets", fake_psets)
+
+        inv = IFCInvestigator()
+        el = self.FakeEl(1)
+        assert inv.get_psets(el) == {"Qto": {"NetVolume": 1.0}}
+        assert inv.get_psets(el) == {"Qto": {"NetVolume": 1.0}}
+        assert len(calls) == 1
+        stats = inv.pset_cache_stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+
+    def test_cache_is_bounded(self, monkeypatch):
+        import ifcopenshell.util.element as util_el
+        monkeypatch.setattr(util_el, "get_psets", lambda e: {"P": {"v": e.id()}})
+
+        inv = IFCInvestigator(pset_cache_size=2)
+        for i in range(5):
+            inv.get_psets(self.FakeEl(i))
+        assert inv.pset_cache_stats()["size"] == 2
+
+    def test_open_ifc_invalidates_cache(self, monkeypatch):
+        import ifcopenshell
+        import ifcopenshell.util.element as util_el
+        monkeypatch.setattr(util_el, "get_psets", lambda e: {"P": {"v": 1}})
+
+        class FakeModel:
+            def by_type(self, t):
+                return []
+        monkeypatch.setattr(ifcopenshell, "open", lambda path: FakeModel())
+
+        inv = IFCInvestigator()
+        inv.get_psets(self.FakeEl(1))
+        inv.open_ifc("model.ifc")
+        stats = inv.pset_cache_stats()
+        assert stats["size"] == 0
+        assert stats["misses"] == 0
+
+    def test_sum_and_filter_share_the_cache(self, monkeypatch):
+        import ifcopenshell.util.element as util_el
+
+        calls = []
+        def fake_psets(e):
+            calls.append(e)
+            return {"Pset_WallCommon": {"LoadBearing": True},
+                    "Qto_WallBaseQuantities": {"NetVolume": 2.0}}
+        monkeypatch.setattr(util_el, "get_psets", fake_psets)
+
+        class Wall(self.FakeEl):
+            PredefinedType = "SOLIDWALL"
+
+        inv = IFCInvestigator()
+        inv.ifc_file = object()
+        inv.index_by_class = {"IfcWall": [Wall(1), Wall(2)]}
+        elems = inv._filter_single({
+            "ifc_class": "IfcWall", "predefined": "SOLIDWALL",
+            "props": [{"pset": "Pset_WallCommon", "prop": "LoadBearing", "value": True}],
+        })
+        total, _ = inv.sum_quantity(elems, "Qto_WallBaseQuantities", "NetVolume")
+        assert abs(total - 4.0) < 1e-9
+        assert len(calls) == 2
+
+
+class TestStoreyIndex:
+
+    @pytest.fixture
+    def inv(self, tmp_path):
+        import ifcopenshell
+        import ifcopenshell.api as api
+
+        f = ifcopenshell.file(schema="IFC4")
+        proj = api.run("root.create_entity", f, ifc_class="IfcProject", name="P")
+        bld = api.run("root.create_entity", f, ifc_class="IfcBuilding", name="B")
+        storey = api.run("root.create_entity", f, ifc_class="IfcBuildingStorey", name="Piso 1")
+        space = api.run("root.create_entity", f, ifc_class="IfcSpace", name="Sala")
+        api.run("aggregate.assign_object", f, relating_object=proj, products=[bld])
+        api.run("aggregate.assign_object", f, relating_object=bld, products=[storey])
+        api.run("aggregate.assign_object", f, relating_object=storey, products=[space])
+
+        wall = api.run("root.create_entity", f, ifc_class="IfcWall", name="wall")
+        api.run("spatial.assign_container", f, relating_structure=storey, products=[wall])
+        opening = api.run("root.create_entity", f, ifc_class="IfcOpeningElement")
+        api.run("feature.add_feature", f, feature=opening, element=wall)
+        window = api.run("root.create_entity", f, ifc_class="IfcWindow", name="window")
+        api.run("feature.add_filling", f, opening=opening, element=window)
+        furn = api.run("root.create_entity", f, ifc_class="IfcFurniture", name="furniture")
+        api.run("spatial.assign_container", f, relating_structure=space, products=[furn])
+        asm = api.run("root.create_entity", f, ifc_class="IfcElementAssembly")
+        api.run("spatial.assign_container", f, relating_structure=storey, products=[asm])
+        bar = api.run("root.create_entity", f, ifc_class="IfcReinforcingBar", name="bar")
+        api.run("aggregate.assign_object", f, relating_object=asm, products=[bar])
+        api.run("root.create_entity", f, ifc_class="IfcBeam", name="loose")
+
+        path = tmp_path / "storeys.ifc"
+        f.write(str(path))
+        inv = IFCInvestigator()
+        inv.open_ifc(str(path))
+        return inv
+
+    def _by_name(self, inv, name):
+        return next(e for e in inv.ifc_file.by_type("IfcProduct") if e.Name == name)
+
+    @pytest.mark.parametrize("name,expected", [
+        ("wall", "Piso 1"), ("window", "Piso 1"), ("furniture", "Piso 1"),
+        ("bar", "Piso 1"), ("loose", "n/a"),
+    ])
+    def test_storey_lookup(self, inv, name, expected):
+        assert inv.get_building_storey(self._by_name(inv, name)) == expected
+
+    def test_index_matches_container_walk(self, inv):
+        for e in inv.ifc_file.by_type("IfcProduct"):
+            assert inv.get_building_storey(e) == inv._walk_building_storey(e)
+
+
+class TestMaterialIndex:
+
+    @pytest.fixture
+    def inv(self, tmp_path):
+        import ifcopenshell
+        import ifcopenshell.api as api
+
+        f = ifcopenshell.file(schema="IFC4")
+        api.run("root.create_entity", f, ifc_class="IfcProject", name="P")
+        conc = api.run("material.add_material", f, name="C30/37", category="Concrete")
+        steel = api.run("material.add_material", f, name="S275", category="Steel")
+        wood = api.run("material.add_material", f, name="Pinho", category="Wood")
+
+        lset = api.run("material.add_material_set", f, name="L", set_type="IfcMaterialLayerSet")
+        api.run("material.add_layer", f, layer_set=lset, material=conc)
+        cset = api.run("material.add_material_set", f, name="C", set_type="IfcMaterialConstituentSet")
+        api.run("material.add_constituent", f, constituent_set=cset, material=steel)
+        mlist = f.createIfcMaterialList([wood, steel])
+
+        def product(cls, name, material=None):
+            e = api.run("root.create_entity", f, ifc_class=cls, name=name)
+            if material is not None:
+                f.createIfcRelAssociatesMaterial(
+                    ifcopenshell.guid.new(), None, None, None, [e], material)
+            return e
+
+        product("IfcWall", "usage", f.createIfcMaterialLayerSetUsage(lset, "AXIS2", "POSITIVE", 0.0))
+        product("IfcColumn", "constituents", cset)
+        product("IfcBeam", "list", mlist)
+        product("IfcSlab", "plain", conc)
+        wtype = api.run("root.create_entity", f, ifc_class="IfcWallType", name="WT")
+        f.createIfcRelAssociatesMaterial(ifcopenshell.guid.new(), None, None, None, [wtype], wood)
+        typed = product("IfcWall", "typed")
+        api.run("type.assign_type", f, related_objects=[typed], relating_type=wtype)
+        product("IfcWall", "none")
+
+        path = tmp_path / "materials.ifc"
+        f.write(str(path))
+        inv = IFCInvestigator()
+        inv.open_ifc(str(path))
+        return inv
+
+    def _names(self, elems):
+        return sorted(e.Name for e in elems)
+
+    def _products(self, inv):
+        return list(inv.ifc_file.by_type("IfcProduct"))
+
+    def test_pairs_cover_sets_lists_and_types(self, inv):
+        pairs = {e.Name: inv.get_material_pairs(e) for e in self._products(inv)}
+        assert pairs["usage"] == (("C30/37", "Concrete"),)
+        assert pairs["constituents"] == (("S275", "Steel"),)
+        assert pairs["list"] == (("Pinho", "Wood"), ("S275", "Steel"))
+        assert pairs["typed"] == (("Pinho", "Wood"),)
+        assert pairs["none"] == ()
+
+    def test_filter_by_category(self, inv):
+        elems = self._products(inv)
+        assert self._names(inv._apply_material_filter(elems, "concrete")) == ["plain", "usage"]
+        assert self._names(inv._apply_material_filter(elems, {"category": "Steel"})) == ["constituents", "list"]
+
+    def test_filter_by_name(self, inv):
+        elems = self._products(inv)
+        assert self._names(inv._apply_material_filter(elems, {"name": "pinho"})) == ["list", "typed"]
+
+    def test_empty_filter_keeps_everything(self, inv):
+        elems = self._products(inv)
+        assert inv._apply_material_filter(elems, "") == elems
+
+    def test_catalog(self, inv):
+        assert inv.extract_all_materials() == {
+            "Concrete": "C30/37", "Steel": "S275", "Wood": "Pinho",
+        }
+
+
+class TestPredefinedTypes:
+
+    @pytest.fixture
+    def path(self, tmp_path):
+        import ifcopenshell
+        import ifcopenshell.api as api
+
+        f = ifcopenshell.file(schema="IFC4")
+        api.run("root.create_entity", f, ifc_class="IfcProject", name="P")
+        api.run("root.create_entity", f, ifc_class="IfcWall", name="solid", predefined_type="SOLIDWALL")
+        api.run("root.create_entity", f, ifc_class="IfcWall", name="unset")
+        api.run("root.create_entity", f, ifc_class="IfcBuildingElementProxy", name="proxy")
+        path = tmp_path / "predefs.ifc"
+        f.write(str(path))
+        return str(path)
+
+    def test_catalog_lists_every_class(self, path):
+        inv = IFCInvestigator()
+        inv.open_ifc(path)
+        assert inv.list_classes() == ["IfcBuildingElementProxy", "IfcWall"]
+        assert inv.list_predefined_types("IfcWall") == ["NOTDEFINED", "SOLIDWALL"]
+        assert inv.list_predefined_types("IfcBuildingElementProxy") == ["NOTDEFINED"]
+
+    @pytest.mark.parametrize("indexed", [False, True])
+    def test_notdefined_matches_unset_elements(self, path, indexed):
+        inv = IFCInvestigator()
+        inv.open_ifc(path, indexed=indexed)
+        names = lambda spec: [e.Name for e in inv._filter_single(spec)]
+        assert names({"ifc_class": "IfcWall", "predefined": "NOTDEFINED"}) == ["unset"]
+        assert names({"ifc_class": "IfcWall", "predefined": "SOLIDWALL"}) == ["solid"]
+        assert names({"ifc_class": "IfcBuildingElementProxy", "predefined": "NOTDEFINED"}) == ["proxy"]
+
+
+class TestClassificationIndex:
+
+    def _write(self, path, codes):
+        import ifcopenshell
+        import ifcopenshell.api as api
+
+        f = ifcopenshell.file(schema="IFC4")
+        api.run("root.create_entity", f, ifc_class="IfcProject", name="P")
+        systems = {}
+        for name, assignments in codes.items():
+            wall = api.run("root.create_entity", f, ifc_class="IfcWall", name=name)
+            for system, code in assignments:
+                if system not in systems:
+                    systems[system] = api.run("classification.add_classification", f,
+                                              classification=system)
+                api.run("classification.add_reference", f, products=[wall],
+                        identification=code, name=code, classification=systems[system])
+        f.write(str(path))
+        return str(path)
+
+    def _wall(self, inv, name):
+        return next(e for e in inv.index_by_class["IfcWall"] if e.Name == name)
+
+    def test_multiple_systems(self, tmp_path):
+        path = self._write(tmp_path / "a.ifc", {
+            "W": [("Uniclass", "Ss_20"), ("ProNIC", "08.01")],
+            "X": [],
+        })
+        inv = IFCInvestigator()
+        inv.open_ifc(path)
+        wall = self._wall(inv, "W")
+        assert inv.get_classifications(wall) == [("Uniclass", "Ss_20"), ("ProNIC", "08.01")]
+        assert inv.get_classification_code(wall) == "Ss_20, 08.01"
+        assert inv.get_classification_code(wall, system="ProNIC") == "08.01"
+        assert inv.get_classification_code(self._wall(inv, "X")) == "n/a"
+
+    def test_rebuilt_when_another_model_is_opened(self, tmp_path):
+        first = self._write(tmp_path / "a.ifc", {"W": [("Uniclass", "Ss_20")]})
+        second = self._write(tmp_path / "b.ifc", {"Z": [], "W": [("Uniclass", "Ss_30")]})
+        inv = IFCInvestigator()
+        inv.open_ifc(first)
+        assert inv.get_classification_code(self._wall(inv, "W")) == "Ss_20"
+        inv.open_ifc(second)
+        assert inv.get_classification_code(self._wall(inv, "W")) == "Ss_30"
+        assert inv.get_classification_code(self._wall(inv, "Z")) == "n/a"
@@ -10,6 +10,7 @@ from app.gui.wbs_helpers import (
     find_wbs_columns,
     unpack_core_columns,
     split_levels,
+    WBSIndex,
 )
 
 
@@ -221,3 +222,49 @@ class TestSplitLevels:
         df = pd.DataFrame({"NIVEL": ["1", "2", "10"]})
         result = split_levels(df, "NIVEL")
         assert list(result) == [1, 2, 10]
+
+
+class TestWBSIndex:
+
+    COLS = {"col_wbs": "WBS", "col_desc": "DESCRIÇÃO", "col_nivel": "Nível",
+            "col_unidades": "UNID."}
+
+    def _df(self):
+        return pd.DataFrame({
+            "Nível":     [1, 2, 3, 10, 3, 3, 10],
+            "WBS":       ["08", "08.01", "08.01.01", None, "08.01.02", "08.01.03", None],
+            "DESCRIÇÃO": ["Estruturas", "Betão", "Paredes", "Paredes betão",
+                          "Pilares", "Lajes", "Lajes betão"],
+            "UNID.":     [None, None, None, "m3", None, None, " "],
+        })
+
+    def test_rows(self):
+        idx = WBSIndex(self._df(), self.COLS)
+        assert idx.leaf_row("08.01.01") == 2
+        assert idx.desc_row("08.01.01") == 3
+        assert idx.desc_row("08.01.02") is None
+        assert idx.leaf_row("99") is None
+
+    def test_desc_and_unit(self):
+        idx = WBSIndex(self._df(), self.COLS)
+        assert idx.desc_and_unit("08.01.01") == ("Paredes betão", "m3")
+        assert idx.desc_and_unit("08.01.03") == ("Lajes betão", "")
+        assert idx.desc_and_unit("08.01.02") == ("", "n/a")
+
+    def test_parent_children(self):
+        idx = WBSIndex(self._df(), self.COLS)
+        assert idx.parent["08.01.02"] == "08.01"
+        assert idx.children["08.01"] == ["08.01.01", "08.01.02", "08.01.03"]
+        assert "08" not in idx.parent
+
+    def test_wbs_rows_skip_level10(self):
+        rows = WBSIndex(self._df(), self.COLS).wbs_rows()
+        assert [r["wbs_codigo"] for r in rows] == ["08", "08.01", "08.01.01", "08.01.02", "08.01.03"]
+
+    def test_is_current(self):
+        df = self._df()
+        idx = WBSIndex(df, self.COLS)
+        assert idx.is_current(df)
+        assert not idx.is_current(df.copy())
+        df.loc[len(df)] = [10, None, "", None]
+        assert not idx.is_current(df)
@@ -0,0 +1,35 @@
+import sys, os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import openpyxl
+import pandas as pd
+
+from app.core.xlsx_writer import write_report_sheet, GRAY_FILL, WHITE_FILL, WARN_FILL
+
+
+class TestWriteReportSheet:
+
+    def _write(self, tmp_path):
+        df = pd.DataFrame([
+            ("08",       "Cap",    "",    float("nan"), ""),
+            ("08.01",    "Parede", 2.5,   "m2",         2.5),
+            ("08.02",    "Laje",   "",    "",           "[ELEMENTOS NÃO ENCONTRADOS]"),
+        ], columns=["WBS", "Descrição", "QDTE.", "UNID.", "QUANTIDADE"])
+        path = tmp_path / "out.xlsx"
+        write_report_sheet(path, df, ["wbs", "desc10", "desc10"], [False, False, True])
+        return openpyxl.load_workbook(path)["WBS Preenchido"]
+
+    def test_values(self, tmp_path):
+        ws = self._write(tmp_path)
+        assert [c.value for c in ws[1]] == ["WBS", "Descrição", "QDTE.", "UNID.", "QUANTIDADE"]
+        assert ws["C3"].value == 2.5
+        assert ws["D2"].value is None
+
+    def test_row_styles_come_from_kinds(self, tmp_path):
+        ws = self._write(tmp_path)
+        assert ws["A1"].font.b
+        fills = [ws.cell(row=r, column=1).fill.fgColor.rgb for r in (2, 3, 4)]
+        assert fills == ["00" + f.fgColor.rgb[2:] for f in (GRAY_FILL, WHITE_FILL, WARN_FILL)]
+        assert all(c.border.left.style == "thin" for c in ws[4])
+        assert ws.column_dimensions["B"].width == 50